@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+from benchmarks.checkout_concurrency import client, post
+
+# ONE PATRON VISIT (RENTALS, A RESERVATION AND ITS CANCELLATION) AS SEPARATE REQUESTS AND AS ONE POST /batch
+#   python -m benchmarks.batch_visit --visits 50 --rentals 5
+#   python -m benchmarks.batch_visit --url http://localhost:8000
+# AN OPERATION THAT FAILS IN EITHER MODE OR A BATCH THAT DOES NOT COMMIT EXITS NON-ZERO
+
+# RENTALS OF A TITLE WITH FREE COPIES, THE RESERVATION IS FOR ONE WITHOUT ANY SINCE ONLY THOSE CAN BE RESERVED
+def visit_operations(user_id: str, publication_id: str, waitlist_id: str, rentals: int):
+    reservation_id = str(uuid.uuid4())
+    operations = [{"method": "POST", "path": "/rentals", "body": {"id": str(uuid.uuid4()), "user_id": user_id, "publication_id": publication_id, "duration": 7}}
+                  for _ in range(rentals)]
+    operations.append({"method": "POST", "path": "/reservations", "body": {"id": reservation_id, "user_id": user_id, "publication_id": waitlist_id}})
+    operations.append({"method": "DELETE", "path": f"/reservations/{reservation_id}"})
+    return operations
+
+async def separate(http, operations: list):
+    statuses, queries = [], 0
+    for operation in operations:
+        response = await http.request(operation["method"], operation["path"], json=operation.get("body"))
+        statuses.append(response.status_code)
+        queries += int(response.headers.get("x-query-count", 0))
+    return statuses, queries, True
+
+async def batched(http, operations: list):
+    response = await http.post("/batch", json={"operations": operations})
+    if response.status_code != 200:
+        raise RuntimeError(f"POST /batch -> {response.status_code} {response.text}")
+    body = response.json()
+    return [result["status"] for result in body["results"]], int(response.headers.get("x-query-count", 0)), body["committed"]
+
+async def run(url: str, visits: int, rentals: int):
+    failures = []
+    async with client(url) as http:
+        publication_id, waitlist_id = str(uuid.uuid4()), str(uuid.uuid4())
+        for id in (publication_id, waitlist_id):
+            await post(http, "/publications", {"id": id, "title": f"visit-{id}", "authors": [], "categories": []})
+        for _ in range(2 * visits * rentals):
+            await post(http, "/instances", {"id": str(uuid.uuid4()), "type": "physical", "publisher": "bench", "year": 2023, "status": "available", "publication_id": publication_id})
+
+        for mode, execute in [("separate", separate), ("batch", batched)]:
+            latencies, queries = [], []
+            for _ in range(visits):
+                user_id = str(uuid.uuid4())
+                await post(http, "/users", {"id": user_id, "name": "bench", "surname": "bench", "email": f"{user_id}@bench.sk", "birth_date": "2000-01-01", "personal_identificator": "bench"})
+                operations = visit_operations(user_id, publication_id, waitlist_id, rentals)
+
+                started = time.perf_counter()
+                statuses, count, committed = await execute(http, operations)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(count)
+
+                if any(status >= 400 for status in statuses) or not committed:
+                    failures.append(f"{mode}: statuses {statuses} committed={committed}")
+
+            print(f"{mode:<9} {len(operations)} operations per visit  mean={statistics.mean(latencies):7.1f}ms  "
+                  f"p50={statistics.median(latencies):7.1f}ms  queries={statistics.mean(queries):.0f}")
+
+    for failure in failures[:10]:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Patron visit as separate requests and as one POST /batch")
+    parser.add_argument("--url", help="running server, the app is called in process when omitted")
+    parser.add_argument("--visits", type=int, default=50)
+    parser.add_argument("--rentals", type=int, default=5)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.url, args.visits, args.rentals)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+# FIRES N PARALLEL POST /rentals FOR ONE TITLE WITH K COPIES AND CHECKS NO COPY IS RENTED TWICE
+# ALSO PRINTS HOW LONG THE PARALLEL CHECKOUTS TOOK, ALL OF THEM HIT THE SAME AVAILABILITY COUNTER
+#   python -m benchmarks.checkout_concurrency --checkouts 50 --copies 20
+#   python -m benchmarks.checkout_concurrency --url http://localhost:8000
+
+def client(url: str):
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+
+    from dbs_assignment.app import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+async def post(http, path: str, body: dict):
+    response = await http.post(path, json=body)
+    if response.status_code != 201:
+        raise RuntimeError(f"POST {path} -> {response.status_code} {response.text}")
+    return response.json()
+
+async def run(url: str, checkouts: int, copies: int):
+    async with client(url) as http:
+        publication_id = str(uuid.uuid4())
+        await post(http, "/publications", {"id": publication_id, "title": f"checkout-{publication_id}", "authors": [], "categories": []})
+        for _ in range(copies):
+            await post(http, "/instances", {"id": str(uuid.uuid4()), "type": "physical", "publisher": "bench", "year": 2023, "status": "available", "publication_id": publication_id})
+
+        user_ids = []
+        for _ in range(checkouts):
+            user_id = str(uuid.uuid4())
+            await post(http, "/users", {"id": user_id, "name": "bench", "surname": "bench", "email": f"{user_id}@bench.sk", "birth_date": "2000-01-01", "personal_identificator": "bench"})
+            user_ids.append(user_id)
+
+        async def checkout(user_id: str):
+            started = time.perf_counter()
+            response = await http.post("/rentals", json={"id": str(uuid.uuid4()), "user_id": user_id, "publication_id": publication_id, "duration": 7})
+            return response, time.perf_counter() - started
+
+        started = time.perf_counter()
+        timed = await asyncio.gather(*(checkout(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - started
+        responses = [response for response, _ in timed]
+        latencies = sorted(latency for _, latency in timed)
+
+        rented = [response.json()["publication_instance_id"] for response in responses if response.status_code == 201]
+        statuses = Counter(response.status_code for response in responses)
+        reserved = (await http.get("/instances", params={"publication_id": publication_id, "status": "reserved", "limit": 200})).json()["items"]
+
+        duplicates = [instance_id for instance_id, count in Counter(rented).items() if count > 1]
+        expected = min(checkouts, copies)
+
+        print(f"checkouts={checkouts} copies={copies} statuses={dict(statuses)} rented={len(rented)} reserved={len(reserved)}")
+        print(f"wall={elapsed * 1000:.0f}ms checkouts/s={checkouts / elapsed:.0f} p50={statistics.median(latencies) * 1000:.1f}ms "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms")
+
+        failures = []
+        if duplicates:
+            failures.append(f"{len(duplicates)} copies rented more than once")
+        if len(rented) != expected:
+            failures.append(f"expected {expected} successful checkouts, got {len(rented)}")
+        if len(reserved) != len(rented):
+            failures.append(f"{len(reserved)} copies reserved for {len(rented)} rentals")
+
+        for failure in failures:
+            print("FAIL", failure)
+
+        # DOUBLE ALLOCATED COPIES CAN BREAK THE CASCADE, THE VERDICT IS ALREADY PRINTED
+        try:
+            await http.delete(f"/publications/{publication_id}")
+        except Exception as error:
+            print(f"cleanup of publication {publication_id} failed: {error.__class__.__name__}")
+
+        return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel checkout consistency check")
+    parser.add_argument("--url", default="", help="running server, the app is driven in-process when omitted")
+    parser.add_argument("--checkouts", type=int, default=50)
+    parser.add_argument("--copies", type=int, default=20)
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.url, args.checkouts, args.copies))
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import io
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.errors import UniqueViolation
+
+from dbs_assignment.availability import COUNTER_SHARDS
+from dbs_assignment.database import engine
+from dbs_assignment.migrations import migrate
+
+# FILLS THE DATABASE WITH A SYNTHETIC LIBRARY FOR THE BENCHMARKS
+#   python -m benchmarks.datagen --reset --publications 1000000 --users 200000 --seed 12345
+# ROWS ARE STREAMED WITH COPY, THE SAME SEED GENERATES THE SAME IDS AND WORDS SO OTHER BENCHMARKS CAN QUERY THEM
+# ONLY ACTIVE RENTALS ARE DATED FROM THE TIME OF THE RUN, SO THEY ARE NOT ALL OVERDUE BY THE NEXT ONE
+# --reset EMPTIES EVERY TABLE OF THE LIBRARY FIRST, A SECOND RUN WITH THE SAME SEED NEEDS IT
+
+SEED = 12345
+SYLLABLES = ["ka", "ro", "mi", "ta", "ne", "sa", "lo", "vi", "de", "po", "ri", "zu", "ba", "le", "on",
+             "tra", "ski", "dor", "vel", "mar", "ian", "ost", "gra", "bel", "tor", "lin", "sen", "hor"]
+FIRST_NAMES = ["Ján", "Peter", "Mária", "Eva", "John", "Anna", "Martin", "Zuzana", "Tomáš", "Jana", "George", "Ursula"]
+INSTANCE_TYPES = ["physical", "ebook", "audiobook"]
+PUBLISHERS = ["Slovart", "Ikar", "Albatros", "Penguin", "Tatran", "Allen & Unwin", "Vydavateľstvo SAV"]
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+TABLES = ["reservations", "reservation_queues", "rentals", "cards", "users", "availability_counts", "instances",
+          "publications_authors", "publications_categories", "publications", "authors", "categories"]
+
+def vocabulary(seed: int, size: int = 5000):
+    generator = random.Random(seed)
+    words = {}
+    while len(words) < size:
+        word = "".join(generator.choice(SYLLABLES) for _ in range(generator.randint(2, 4)))
+        words.setdefault(word, None)
+    return list(words)
+
+# ZIPF LIKE, A FEW WORDS ARE IN MANY TITLES AND MOST ARE RARE, LIKE IN A REAL CATALOG
+def word_weights(words: list):
+    return [1 / rank for rank in range(1, len(words) + 1)]
+
+def make_id(generator) -> str:
+    return str(uuid.UUID(int=generator.getrandbits(128), version=4))
+
+def copy_rows(cursor, table: str, columns: list, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(str(value) for value in row) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+def stamp(generator):
+    return (START + timedelta(seconds=generator.randint(0, 3 * 365 * 24 * 3600), microseconds=generator.randint(0, 999999))).isoformat()
+
+def generate_users(cursor, generator, words: list, users: int, seed: int):
+    ids = [make_id(generator) for _ in range(users)]
+    rows, cards = [], []
+    for index, id in enumerate(ids):
+        now = stamp(generator)
+        surname = generator.choice(words).capitalize()
+        birth_date = (datetime(1950, 1, 1, tzinfo=timezone.utc) + timedelta(days=generator.randint(0, 20000))).isoformat()
+        rows.append((id, generator.choice(FIRST_NAMES), surname, f"{surname.lower()}.{index}.{seed}@bench.sk", birth_date, str(generator.randint(10**9, 10**10 - 1)), now, now))
+        cards.append((make_id(generator), id, str(generator.getrandbits(64)).zfill(20)[:20], "active" if generator.random() < 0.9 else "expired", now, now))
+    copy_rows(cursor, "users", ["id", "name", "surname", "email", "birth_date", "personal_identificator", "created_at", "updated_at"], rows)
+    copy_rows(cursor, "cards", ["id", "user_id", "magstripe", "status", "created_at", "updated_at"], cards)
+    return ids
+
+def generate(connection, publications: int, users: int, returned: float, queue: float, seed: int, chunk: int):
+    generator = random.Random(seed)
+    words = vocabulary(seed)
+    weights = word_weights(words)
+    cursor = connection.cursor()
+    now = datetime.now(timezone.utc)
+
+    cursor.execute("SELECT name FROM categories")
+    taken_categories = {name for name, in cursor.fetchall()}
+    categories = [(make_id(generator), name) for name in words[:300] if name not in taken_categories]
+    copy_rows(cursor, "categories", ["id", "name", "created_at", "updated_at"],
+        ((id, name, created, created) for id, name in categories for created in [stamp(generator)]))
+
+    cursor.execute("SELECT name, surname FROM authors")
+    taken_authors = {tuple(row) for row in cursor.fetchall()}
+    authors = {}
+    for _ in range(max(publications // 5, 1)):
+        key = (generator.choice(FIRST_NAMES), generator.choice(words).capitalize())
+        if key not in taken_authors:
+            authors.setdefault(key, make_id(generator))
+    copy_rows(cursor, "authors", ["id", "name", "surname", "created_at", "updated_at"],
+        ((id, name, surname, created, created) for (name, surname), id in authors.items() for created in [stamp(generator)]))
+
+    user_ids = generate_users(cursor, generator, words, max(users, 1), seed)
+    author_ids = list(authors.values())
+    category_ids = [id for id, _ in categories] or [None]
+    counts = {"categories": len(categories), "authors": len(author_ids), "users": len(user_ids),
+              "publications": 0, "instances": 0, "rentals": 0, "reservations": 0}
+
+    for offset in range(0, publications, chunk):
+        rows, author_links, category_links, instances, rentals, reservations, queues = [], [], [], [], [], [], []
+        for _ in range(min(chunk, publications - offset)):
+            id, created = make_id(generator), stamp(generator)
+            title = " ".join(generator.choices(words, weights, k=generator.randint(1, 5))).capitalize()
+            rows.append((id, title, created, created))
+            for author_id in set(generator.sample(author_ids, min(len(author_ids), generator.randint(1, 2)))):
+                author_links.append((id, author_id))
+            for category_id in set(generator.sample(category_ids, min(len(category_ids), generator.randint(1, 2)))):
+                if category_id is not None:
+                    category_links.append((id, category_id))
+
+            free = 0
+            for _ in range(generator.randint(0, 4)):
+                instance_id, status = make_id(generator), "available" if generator.random() < 0.7 else "reserved"
+                instances.append((instance_id, generator.choice(INSTANCE_TYPES), generator.choice(PUBLISHERS),
+                    generator.randint(1950, 2023), status, id, created, created))
+                free += status == "available"
+
+                # A RESERVED COPY IS OUT WITH AN ACTIVE RENTAL, EVERY COPY HAS ABOUT returned FINISHED ONES BEHIND IT
+                if status == "reserved":
+                    started = (now - timedelta(days=generator.randint(0, 6), seconds=generator.randint(0, 86399))).isoformat()
+                    rentals.append((make_id(generator), generator.choice(user_ids), instance_id, generator.randint(7, 14), started, "active", started))
+                while generator.random() < returned / (returned + 1):
+                    started = stamp(generator)
+                    rentals.append((make_id(generator), generator.choice(user_ids), instance_id, generator.randint(1, 14), started, "returned", started))
+
+            # ONLY A TITLE WITHOUT A FREE COPY CAN BE RESERVED, ITS QUEUE IS NUMBERED FROM 1
+            if not free:
+                waiting = generator.randint(0, round(2 * queue))
+                for position in range(1, waiting + 1):
+                    reserved = stamp(generator)
+                    reservations.append((make_id(generator), generator.choice(user_ids), id, position, reserved, reserved))
+                if waiting:
+                    queues.append((id, waiting))
+
+        copy_rows(cursor, "publications", ["id", "title", "created_at", "updated_at"], rows)
+        copy_rows(cursor, "publications_authors", ["publication_id", "author_id"], author_links)
+        copy_rows(cursor, "publications_categories", ["publication_id", "category_id"], category_links)
+        copy_rows(cursor, "instances", ["id", "type", "publisher", "year", "status", "publication_id", "created_at", "updated_at"], instances)
+        copy_rows(cursor, "rentals", ["id", "user_id", "publication_instance_id", "duration", "start_date", "status", "updated_at"], rentals)
+        copy_rows(cursor, "reservations", ["id", "user_id", "publication_id", "queue_position", "created_at", "updated_at"], reservations)
+        copy_rows(cursor, "reservation_queues", ["publication_id", "last_position"], queues)
+        counts["publications"] += len(rows)
+        counts["instances"] += len(instances)
+        counts["rentals"] += len(rentals)
+        counts["reservations"] += len(reservations)
+        connection.commit()
+        print(f"  {counts['publications']}/{publications} publications", file=sys.stderr)
+
+    # COPY BYPASSES THE HANDLERS THAT KEEP THE COUNTERS, THEY ARE REBUILT FOR THE WHOLE TABLE ONCE
+    cursor.execute(
+        "INSERT INTO availability_counts (publication_id, type, shard, total, available) "
+        f"SELECT publication_id, type, get_byte(decode(md5(id), 'hex'), 15) % {COUNTER_SHARDS}, count(*), count(*) FILTER (WHERE status = 'available') "
+        "FROM instances GROUP BY 1, 2, 3 "
+        "ON CONFLICT (publication_id, type, shard) DO UPDATE SET total = EXCLUDED.total, available = EXCLUDED.available")
+    connection.commit()
+    connection.set_session(autocommit=True)
+    cursor.execute("VACUUM ANALYZE")
+    connection.set_session(autocommit=False)
+    return counts
+
+def reset(connection):
+    cursor = connection.cursor()
+    cursor.execute(f"TRUNCATE {', '.join(TABLES)}")
+    connection.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic library for the benchmarks")
+    parser.add_argument("--publications", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=None, help="defaults to a quarter of --publications")
+    parser.add_argument("--returned", type=float, default=1.0, help="average finished rentals per copy")
+    parser.add_argument("--queue", type=float, default=1.0, help="average reservations per title without a free copy")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--chunk", type=int, default=50000, help="publications per COPY transaction")
+    parser.add_argument("--reset", action="store_true", help="empty all library tables first")
+    args = parser.parse_args()
+
+    migrate(engine)
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        if args.reset:
+            reset(connection.driver_connection)
+        users = args.users if args.users is not None else args.publications // 4
+        counts = generate(connection.driver_connection, args.publications, users, args.returned, args.queue, args.seed, args.chunk)
+    except UniqueViolation:
+        sys.exit(f"rows of seed {args.seed} already exist, run it with --reset")
+    finally:
+        connection.close()
+
+    seconds = time.perf_counter() - started
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" in {seconds:.1f}s")
+
+if __name__ == "__main__":
+    main()
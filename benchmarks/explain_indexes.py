@@ -0,0 +1,70 @@
+import sys
+
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects import postgresql
+
+from dbs_assignment.database import engine, Base
+from dbs_assignment.migrations import migrate
+from dbs_assignment.models import Author, Card, Category, Instance, Rental, Reservation, User, publications_authors, publications_categories
+
+# RUNS EXPLAIN ON THE HOT HANDLER QUERIES AND CHECKS EACH ONE IS ANSWERED BY THE EXPECTED INDEX
+#   python -m benchmarks.explain_indexes
+# SEQUENTIAL SCANS ARE DISABLED SO THE RESULT DOES NOT DEPEND ON HOW MUCH DATA THE TABLES HOLD
+# EVERY INDEX DECLARED IN models.py MUST ALSO EXIST AFTER THE MIGRATIONS, THE ORM NEVER CREATES ONE ITSELF
+
+INDEX_NODES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+HOT_QUERIES = [
+    ("users by email", select(User).where(User.email == "x@x.sk").limit(1), "users_email_key"),
+    ("cards by user", select(Card).where(Card.user_id == "x").limit(1), "ix_cards_user_id"),
+    ("rentals by user", select(Rental).where(Rental.user_id == "x"), "ix_rentals_user_id"),
+    ("rentals by instance", select(Rental).where(Rental.publication_instance_id == "x"), "ix_rentals_publication_instance_id"),
+    ("reservation queue head", select(Reservation.id, Reservation.user_id).where(Reservation.publication_id == "x").order_by(Reservation.queue_position).limit(1), "ix_reservations_publication_id_queue_position"),
+    ("reservation queue rank", select(func.count().filter(Reservation.queue_position <= 1), func.count()).where(Reservation.publication_id == "x"), "ix_reservations_publication_id_queue_position"),
+    ("reservations by publication", select(Reservation).where(Reservation.publication_id == "x"), "ix_reservations_publication_id_queue_position"),
+    ("reservations by user", select(Reservation).where(Reservation.user_id == "x"), "ix_reservations_user_id"),
+    ("available instance", select(Instance).where(Instance.publication_id == "x", Instance.status == "available").limit(1), "ix_instances_publication_id_status"),
+    ("author by name", select(Author).where(Author.name == "x", Author.surname == "y").limit(1), "ix_authors_name_surname"),
+    ("category by name", select(Category).where(Category.name == "x").limit(1), "ix_categories_name"),
+    ("authors of publication", select(publications_authors).where(publications_authors.c.publication_id == "x"), "publications_authors_pkey"),
+    ("publications of author", select(publications_authors).where(publications_authors.c.author_id == "x"), "ix_publications_authors_author_id"),
+    ("categories of publication", select(publications_categories).where(publications_categories.c.publication_id == "x"), "publications_categories_pkey"),
+    ("publications of category", select(publications_categories).where(publications_categories.c.category_id == "x"), "ix_publications_categories_category_id"),
+]
+
+def plan_indexes(node):
+    found = set()
+    if node.get("Node Type") in INDEX_NODES:
+        found.add(node.get("Index Name"))
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+def explain(connection, statement):
+    sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    return plan_indexes(plan[0]["Plan"])
+
+def missing_indexes(connection):
+    existing = set(connection.scalars(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")))
+    return sorted(index.name for table in Base.metadata.tables.values() for index in table.indexes if index.name not in existing)
+
+def main():
+    migrate(engine)
+
+    failures = 0
+    with engine.begin() as connection:
+        for name in missing_indexes(connection):
+            failures += 1
+            print(f"FAIL {name}: declared in models.py but no migration creates it")
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        for name, statement, index in HOT_QUERIES:
+            used = explain(connection, statement)
+            ok = index in used
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name}: expected {index}, plan uses {sorted(used) or 'no index'}")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.checkout_concurrency import client
+from benchmarks.datagen import vocabulary, SEED
+
+# LATENCY OF GET /search FOR A MIX OF QUERY SHAPES OVER THE DATASET OF benchmarks.datagen
+#   python -m benchmarks.datagen --reset --publications 1000000
+#   python -m benchmarks.search_latency --requests 50 --max-p95-ms 100
+# A NON 200 RESPONSE OR A p95 OVER --max-p95-ms EXITS NON-ZERO
+
+def typo(word: str, generator) -> str:
+    index = generator.randrange(len(word) - 1)
+    return word[:index] + word[index + 1] + word[index] + word[index + 2:]
+
+def query_shapes(seed: int):
+    words = vocabulary(seed)
+    return {
+        "common word": lambda generator: words[generator.randrange(10)],
+        "rare word": lambda generator: words[generator.randrange(len(words) // 2, len(words))],
+        "two words": lambda generator: " ".join(generator.sample(words[:500], 2)),
+        "prefix": lambda generator: words[generator.randrange(500)][:3],
+        "typo": lambda generator: typo(words[generator.randrange(500)], generator),
+        "filtered": lambda generator: words[generator.randrange(100)],
+    }
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def run(url: str, requests: int, seed: int, limit: int):
+    generator = random.Random(seed)
+    report, failures = [], []
+    async with client(url) as http:
+        for shape, make in query_shapes(seed).items():
+            latencies, results = [], []
+            for _ in range(requests):
+                params = {"q": make(generator), "limit": limit}
+                if shape == "filtered":
+                    params.update({"available": "true", "type": "ebook"})
+                started = time.perf_counter()
+                response = await http.get("/search", params=params)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    failures.append(f"{shape} {params['q']!r} -> {response.status_code}")
+                    continue
+                results.append(response.json()["facets"]["results"])
+            report.append((shape, latencies, results))
+    return report, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="GET /search latency report")
+    parser.add_argument("--url", default="", help="running server, the app is driven in-process when omitted")
+    parser.add_argument("--requests", type=int, default=50, help="requests per query shape")
+    parser.add_argument("--seed", type=int, default=SEED, help="the seed the dataset was generated with")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    report, failures = asyncio.run(run(args.url, args.requests, args.seed, args.limit))
+
+    print(f"{'shape':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'results':>9}")
+    for shape, latencies, results in report:
+        p95 = percentile(latencies, 0.95)
+        print(f"{shape:<12} {percentile(latencies, 0.5):>8.1f} {p95:>8.1f} {percentile(latencies, 0.99):>8.1f} "
+              f"{max(latencies):>8.1f} {statistics.median(results) if results else 0:>9}")
+        if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+            failures.append(f"{shape}: p95 {p95:.1f}ms over {args.max_p95_ms}ms")
+
+    for failure in failures:
+        print("FAIL", failure)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from dbs_assignment.configuration import conf
+from dbs_assignment.models import Author, Card, Category, Instance, Publication, Rental, Reservation, User
+from dbs_assignment.schemas import (AuthorResponse, CardResponse, CategoryResponse, InstanceResponse, Page,
+    PublicationResponse, RentalResponse, ReservationResponse, UserResponse)
+from dbs_assignment.serializers import render
+
+# PER RESPONSE SERIALIZATION COST OF THE PYDANTIC + json PATH AGAINST THE PRECOMPUTED SERIALIZER + orjson PATH
+#   python -m benchmarks.serialization --page-size 50 --seconds 0.5
+# BOTH PATHS MUST PRODUCE THE SAME JSON, A MISMATCH EXITS NON-ZERO
+
+NOW = datetime(2023, 5, 1, 10, 11, 12, 123456, tzinfo=timezone.utc)
+
+def stamp(index: int):
+    return NOW + timedelta(seconds=index, microseconds=index * 7)
+
+def entity(index: int):
+    return {"id": str(uuid.uuid4()), "created_at": stamp(index), "updated_at": stamp(index)}
+
+def make_category(index):
+    return Category(name=f"category {index}", **entity(index))
+
+def make_author(index):
+    return Author(name=f"name {index}", surname=f"surname {index}", **entity(index))
+
+def make_publication(index):
+    return {"title": f"title {index}", "authors": [{"name": "J. R. R.", "surname": "Tolkien"}, {"name": "C. S.", "surname": "Lewis"}],
+            "categories": ["fantasy", "classics"], **entity(index)}
+
+def make_instance(index):
+    return Instance(type="physical", publisher="Allen & Unwin", year=1937, status="available", publication_id=str(uuid.uuid4()), **entity(index))
+
+def make_card(index):
+    return Card(user_id=str(uuid.uuid4()), magstripe="0" * 20, status="active", **entity(index))
+
+def make_user(index):
+    return User(name="name", surname="surname", email=f"{index}@example.sk", birth_date=stamp(index) - timedelta(days=9000),
+                personal_identificator="123456/7890", **entity(index))
+
+def make_rental(index):
+    return Rental(id=str(uuid.uuid4()), user_id=str(uuid.uuid4()), publication_instance_id=str(uuid.uuid4()), duration=7,
+                  start_date=stamp(index), end_date=stamp(index) + timedelta(days=7), status="active")
+
+def make_reservation(index):
+    return Reservation(id=str(uuid.uuid4()), user_id=str(uuid.uuid4()), publication_id=str(uuid.uuid4()), created_at=stamp(index))
+
+RESOURCES = [
+    ("categories", CategoryResponse, make_category),
+    ("authors", AuthorResponse, make_author),
+    ("publications", PublicationResponse, make_publication),
+    ("instances", InstanceResponse, make_instance),
+    ("cards", CardResponse, make_card),
+    ("users", UserResponse, make_user),
+    ("rentals", RentalResponse, make_rental),
+    ("reservations", ReservationResponse, make_reservation),
+]
+
+def render_with(fast: bool, schema, value) -> bytes:
+    conf.FAST_SERIALIZATION = fast
+    return render(schema, value)
+
+def per_call(fn, seconds: float) -> float:
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * seconds / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization microbenchmark")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=0.3, help="approximate time per measurement")
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'resource':<14}{'shape':<10}{'pydantic us':>14}{'fast us':>12}{'speedup':>10}")
+    for name, schema, make in RESOURCES:
+        single = make(0)
+        page = {"items": [make(index) for index in range(args.page_size)], "next_cursor": None}
+        for shape, response_schema, value in (("detail", schema, single), (f"page {args.page_size}", Page[schema], page)):
+            if json.loads(render_with(False, response_schema, value)) != json.loads(render_with(True, response_schema, value)):
+                mismatches += 1
+                print(f"MISMATCH {name} {shape}")
+            slow = per_call(lambda: render_with(False, response_schema, value), args.seconds)
+            fast = per_call(lambda: render_with(True, response_schema, value), args.seconds)
+            print(f"{name:<14}{shape:<10}{slow * 1e6:>14.1f}{fast * 1e6:>12.1f}{slow / fast:>9.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
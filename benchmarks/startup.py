@@ -0,0 +1,82 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.workloads import free_port
+
+# HOW FAST A NEW WORKER CAN TAKE TRAFFIC: IMPORTING THE APP, AND A UVICORN FROM SPAWN TO ITS FIRST ANSWERED REQUEST
+#   python -m benchmarks.startup --runs 5
+#   python -m benchmarks.startup --workers 4
+# THE IMPORT IS ALSO MEASURED WITH AN UNREACHABLE DATABASE, IT MUST SUCCEED SINCE IMPORTING DOES NOT CONNECT
+# A FAILED IMPORT OR A SERVER THAT DOES NOT ANSWER WITHIN --timeout EXITS NON-ZERO
+
+IMPORT = "import time; started = time.perf_counter(); import dbs_assignment.app; print(time.perf_counter() - started)"
+
+def import_seconds(environment: dict):
+    result = subprocess.run([sys.executable, "-c", IMPORT], capture_output=True, text=True, env=environment)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return float(result.stdout.split()[-1])
+
+# SECONDS FROM SPAWN UNTIL uvicorn ACCEPTS A REQUEST, AND UNTIL A REQUEST THAT NEEDS THE DATABASE ANSWERS
+def serve_seconds(workers: int, timeout: float):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "dbs_assignment.app:app", "--port", str(port),
+                                "--workers", str(workers), "--log-level", "warning"])
+    try:
+        accepting = None
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode}")
+            try:
+                if accepting is None and httpx.get(f"{url}/stats/pool", timeout=1).status_code == 200:
+                    accepting = time.perf_counter() - started
+                if accepting is not None and httpx.get(f"{url}/publications", params={"limit": 1}, timeout=5).status_code == 200:
+                    return accepting, time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"no answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def report(name: str, values: list):
+    print(f"{name:<32} median={statistics.median(values) * 1000:8.1f}ms  min={min(values) * 1000:8.1f}ms  max={max(values) * 1000:8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and server startup time of a worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    failures = []
+    unreachable = dict(os.environ, DATABASE_HOST="127.0.0.1", DATABASE_PORT=str(free_port()))
+    for name, environment in [("import", dict(os.environ)), ("import, database unreachable", unreachable)]:
+        try:
+            report(name, [import_seconds(environment) for _ in range(args.runs)])
+        except RuntimeError as exc:
+            failures.append(f"{name}: {exc}")
+
+    try:
+        runs = [serve_seconds(args.workers, args.timeout) for _ in range(args.runs)]
+        report(f"uvicorn x{args.workers} accepting", [accepting for accepting, _ in runs])
+        report(f"uvicorn x{args.workers} first query", [answered for _, answered in runs])
+    except RuntimeError as exc:
+        failures.append(f"uvicorn: {exc}")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.checkout_concurrency import client
+from benchmarks.datagen import vocabulary, SEED
+from benchmarks.search_latency import percentile
+from dbs_assignment.configuration import conf
+from dbs_assignment.availability import COUNTER_SHARDS
+from dbs_assignment.database import engine
+
+# SCRIPTED WORKLOADS OVER THE DATASET OF benchmarks.datagen, LATENCY PERCENTILES, THROUGHPUT AND QUERIES PER REQUEST
+#   python -m benchmarks.datagen --reset --publications 200000
+#   python -m benchmarks.workloads --sessions 300 --concurrency 16 --output before.json
+#   python -m benchmarks.workloads --serve --workers 2 --baseline before.json --max-regression 0.2 --output after.json
+# THE APP IS CALLED IN PROCESS, WITH --url A RUNNING SERVER IS USED AND WITH --serve A UVICORN IS STARTED FOR THE RUN
+# CHECKOUTS AND RESERVATIONS ARE UNDONE AFTER THE RUN SO THE NEXT ONE STARTS FROM THE SAME DATA
+# A 5xx RESPONSE OR A p95 MORE THAN --max-regression WORSE THAN IN THE BASELINE EXITS NON-ZERO
+
+SETTINGS = ["DATABASE_ASYNC", "FAST_SERIALIZATION", "DATABASE_POOL_SIZE", "DATABASE_MAX_OVERFLOW"]
+TABLES = ["users", "publications", "authors", "categories", "instances", "rentals", "reservations"]
+
+# EVERY REQUEST OF A WORKLOAD UNDER THE NAME OF ITS OPERATION, (milliseconds, status, queries)
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def request(self, http, name: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        response = await http.request(method, path, **kwargs)
+        self.samples[name].append(((time.perf_counter() - started) * 1000, response.status_code, int(response.headers.get("x-query-count", 0))))
+        return response
+
+    def report(self):
+        operations = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = [ms for ms, _, _ in samples]
+            operations[name] = {
+                "requests": len(samples),
+                "rejected": sum(400 <= status < 500 for _, status, _ in samples),
+                "errors": sum(status >= 500 for _, status, _ in samples),
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "p95_ms": round(percentile(latencies, 0.95), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "max_ms": round(max(latencies), 2),
+                "queries": round(sum(queries for _, _, queries in samples) / len(samples), 1),
+            }
+        return operations
+
+# IDS THE WORKLOADS PICK FROM, ORDERED BY A HASH OF THE SEED SO EVERY RUN OVER THE SAME DATA PICKS THE SAME ONES
+def load_fixtures(seed: int, size: int):
+    order = f"md5(id || '{seed}')"
+    with engine.connect() as connection:
+        def ids(statement):
+            return [row[0] for row in connection.execute(text(statement), {"size": size})]
+        return {
+            "publications": ids(f"SELECT id FROM publications ORDER BY {order} LIMIT :size"),
+            "users": ids(f"SELECT id FROM users ORDER BY {order} LIMIT :size"),
+            "authors": ids(f"SELECT id FROM authors ORDER BY {order} LIMIT :size"),
+            "categories": ids("SELECT name FROM categories ORDER BY name LIMIT :size"),
+            # A FREE COPY AND NOBODY WAITING, ANY PATRON CAN CHECK IT OUT
+            "free": ids(f"SELECT publication_id AS id FROM availability_counts GROUP BY publication_id HAVING sum(available) > 0 "
+                        f"AND NOT EXISTS (SELECT 1 FROM reservations WHERE reservations.publication_id = availability_counts.publication_id) "
+                        f"ORDER BY md5(publication_id || '{seed}') LIMIT :size"),
+            # A FEW TITLES WITHOUT A FREE COPY, THE RESERVATION STORM PILES ONTO THEM
+            "waitlist": ids(f"SELECT id FROM publications WHERE NOT EXISTS (SELECT 1 FROM availability_counts "
+                            f"WHERE availability_counts.publication_id = publications.id AND available > 0) ORDER BY {order} LIMIT 10"),
+            "words": vocabulary(seed)[:500],
+        }
+
+async def browse(http, recorder: Recorder, fixtures: dict, generator, created: dict):
+    publication_id = generator.choice(fixtures["publications"])
+    await recorder.request(http, "list publications", "GET", "/publications", params={"limit": 20})
+    page = await recorder.request(http, "filter by category", "GET", "/publications", params={"category": generator.choice(fixtures["categories"]), "limit": 20})
+    if page.status_code == 200 and page.json()["next_cursor"]:
+        await recorder.request(http, "next page", "GET", "/publications", params={"cursor": page.json()["next_cursor"], "limit": 20})
+    await recorder.request(http, "search", "GET", "/search", params={"q": generator.choice(fixtures["words"]), "limit": 20})
+    await recorder.request(http, "publication detail", "GET", f"/publications/{publication_id}")
+    await recorder.request(http, "availability", "GET", f"/publications/{publication_id}/availability")
+    await recorder.request(http, "author detail", "GET", f"/authors/{generator.choice(fixtures['authors'])}")
+
+async def checkout(http, recorder: Recorder, fixtures: dict, generator, created: dict):
+    user_id = generator.choice(fixtures["users"])
+    response = await recorder.request(http, "checkout", "POST", "/rentals", json={
+        "id": str(uuid.uuid4()), "user_id": user_id, "publication_id": generator.choice(fixtures["free"]), "duration": 14})
+    if response.status_code == 201:
+        created["rentals"].append((response.json()["id"], response.json()["publication_instance_id"]))
+    await recorder.request(http, "patron rentals", "GET", "/rentals", params={"user_id": user_id, "limit": 20})
+    await recorder.request(http, "patron detail", "GET", f"/users/{user_id}")
+
+async def reservations(http, recorder: Recorder, fixtures: dict, generator, created: dict):
+    publication_id = generator.choice(fixtures["waitlist"])
+    response = await recorder.request(http, "reserve", "POST", "/reservations", json={
+        "id": str(uuid.uuid4()), "user_id": generator.choice(fixtures["users"]), "publication_id": publication_id})
+    await recorder.request(http, "queue page", "GET", f"/publications/{publication_id}/queue", params={"limit": 20})
+    if response.status_code == 201:
+        reservation_id = response.json()["id"]
+        await recorder.request(http, "queue position", "GET", f"/reservations/{reservation_id}/position")
+        await recorder.request(http, "cancel", "DELETE", f"/reservations/{reservation_id}")
+
+WORKLOADS = {"browse": browse, "checkout": checkout, "reservations": reservations}
+
+# THE COPIES CHECKED OUT BY THE RUN ARE FREE AGAIN AND THEIR COUNTERS MOVE BACK
+def undo(created: dict):
+    rentals = created["rentals"]
+    if not rentals:
+        return
+    with engine.begin() as connection:
+        rental_ids, instance_ids = [rental_id for rental_id, _ in rentals], [instance_id for _, instance_id in rentals]
+        connection.execute(text("DELETE FROM rentals WHERE id = ANY(:ids)"), {"ids": rental_ids})
+        connection.execute(text(
+            "UPDATE availability_counts SET available = available + freed.count "
+            f"FROM (SELECT publication_id, type, get_byte(decode(md5(id), 'hex'), 15) % {COUNTER_SHARDS} AS shard, count(*) "
+            "FROM instances WHERE id = ANY(:ids) AND status = 'reserved' GROUP BY 1, 2, 3) freed "
+            "WHERE availability_counts.publication_id = freed.publication_id AND availability_counts.type = freed.type "
+            "AND availability_counts.shard = freed.shard"), {"ids": instance_ids})
+        connection.execute(text("UPDATE instances SET status = 'available' WHERE id = ANY(:ids)"), {"ids": instance_ids})
+
+async def run_workload(http, workload, fixtures: dict, sessions: int, concurrency: int, seed: int):
+    recorder, created = Recorder(), {"rentals": []}
+    remaining = iter(range(sessions))
+
+    async def worker(index: int):
+        generator = random.Random(seed * 1000 + index)
+        for _ in remaining:
+            await workload(http, recorder, fixtures, generator, created)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    finally:
+        undo(created)
+    seconds = time.perf_counter() - started
+
+    operations = recorder.report()
+    requests = sum(operation["requests"] for operation in operations.values())
+    return {"sessions": sessions, "requests": requests, "seconds": round(seconds, 3),
+            "throughput": round(requests / seconds, 1), "operations": operations}
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+# A UVICORN OF ITS OWN FOR THE RUN, READY ONCE IT ANSWERS
+def serve(workers: int):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "dbs_assignment.app:app", "--port", str(port),
+                                "--workers", str(workers), "--log-level", "warning"])
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if httpx.get(f"{url}/stats/pool").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def dataset():
+    with engine.connect() as connection:
+        return {table: connection.execute(text(f"SELECT count(*) FROM {table}")).scalar() for table in TABLES}
+
+# p95 RATIO PER OPERATION AGAINST THE BASELINE, OPERATIONS UNDER A MILLISECOND ARE TOO NOISY TO JUDGE
+def compare(results: dict, baseline: dict, max_regression: float):
+    regressions = []
+    for workload, report in results["workloads"].items():
+        before = baseline.get("workloads", {}).get(workload, {}).get("operations", {})
+        for name, operation in report["operations"].items():
+            if name not in before:
+                continue
+            old, new = before[name]["p95_ms"], operation["p95_ms"]
+            ratio = new / old if old else 1.0
+            print(f"  {workload:<13} {name:<20} p95 {old:8.1f}ms -> {new:8.1f}ms  {ratio - 1:+7.1%}")
+            if max_regression is not None and old >= 1 and ratio > 1 + max_regression:
+                regressions.append(f"{workload} / {name}: p95 {old}ms -> {new}ms")
+    return regressions
+
+async def run(url: str, workloads: list, fixtures: dict, sessions: int, concurrency: int, seed: int):
+    results = {}
+    async with client(url) as http:
+        for name in workloads:
+            results[name] = report = await run_workload(http, WORKLOADS[name], fixtures, sessions, concurrency, seed)
+            print(f"{name}: {report['requests']} requests in {report['seconds']}s, {report['throughput']} req/s")
+            for operation, stats in report["operations"].items():
+                print(f"  {operation:<20} p50={stats['p50_ms']:7.1f}ms p95={stats['p95_ms']:7.1f}ms p99={stats['p99_ms']:7.1f}ms "
+                      f"queries={stats['queries']:5.1f} rejected={stats['rejected']} errors={stats['errors']}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Workload benchmarks over the dataset of benchmarks.datagen")
+    parser.add_argument("--url", help="running server, the app is called in process when omitted")
+    parser.add_argument("--serve", action="store_true", help="start a uvicorn for the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --serve")
+    parser.add_argument("--workload", action="append", choices=list(WORKLOADS), help="repeatable, all of them when omitted")
+    parser.add_argument("--sessions", type=int, default=200, help="scripted sessions per workload")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=SEED, help="the seed the dataset was generated with")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=None, help="allowed p95 increase against the baseline, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.seed, 1000)
+    if not fixtures["publications"] or not fixtures["users"]:
+        sys.exit("no data, run python -m benchmarks.datagen first")
+
+    process, url = serve(args.workers) if args.serve else (None, args.url)
+    try:
+        started_at = datetime.now(timezone.utc).isoformat()
+        workloads = asyncio.run(run(url, args.workload or list(WORKLOADS), fixtures, args.sessions, args.concurrency, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    results = {
+        "started_at": started_at,
+        "commit": git_commit(),
+        "target": url or "in-process",
+        "workers": args.workers if args.serve else None,
+        "settings": {name: getattr(conf, name) for name in SETTINGS},
+        "options": {"sessions": args.sessions, "concurrency": args.concurrency, "seed": args.seed},
+        "dataset": dataset(),
+        "workloads": workloads,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    failures = [f"{workload} / {name}: {operation['errors']} errors" for workload, report in workloads.items()
+                for name, operation in report["operations"].items() if operation["errors"]]
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            failures += compare(results, json.load(baseline), args.max_regression)
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
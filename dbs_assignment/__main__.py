@@ -1,17 +1,7 @@
-from fastapi import FastAPI
-from dbs_assignment.router import router
-from dbs_assignment.database import Base, engine
-from dbs_assignment.models import *
+# python -m dbs_assignment <command>, THE APP ITSELF IS dbs_assignment.app:app
+# uvicorn dbs_assignment.__main__:app OF EARLIER DEPLOYMENTS STILL WORKS, IT GETS THE SAME MODULE AND THE SAME APP
+from dbs_assignment.app import app
+from dbs_assignment.cli import main
 
-from fastapi import FastAPI, Request, Response, status
-from fastapi.exceptions import RequestValidationError
-
-Base.metadata.create_all(engine)
-
-app = FastAPI(title="DBS")
-
-@app.exception_handler(RequestValidationError)
-async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    return Response("Invalid data", status_code=status.HTTP_400_BAD_REQUEST)
-
-app.include_router(router)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from dbs_assignment.router import router
+from dbs_assignment.database import engine, async_engine, warm_pool
+from dbs_assignment.migrations import migrate
+from dbs_assignment.instrumentation import QueryCountMiddleware, instrument_engine
+from dbs_assignment.cache import invalidation_listener
+from dbs_assignment.sweeper import run_sweeper
+from dbs_assignment.metrics import run_snapshots
+from dbs_assignment.configuration import conf
+from dbs_assignment.models import *
+
+from fastapi import FastAPI, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+# uvicorn dbs_assignment.app:app, python -m dbs_assignment serve RUNS IT THIS WAY
+# IMPORTING THE APP DOES NOT TOUCH THE DATABASE, python -m dbs_assignment migrate PROVISIONS THE SCHEMA BEFORE THE SERVER STARTS
+# EVERY WORKER LISTENS FOR CACHE INVALIDATIONS FROM THE OTHERS AND SWEEPS OVERDUE RENTALS FOR AS LONG AS IT SERVES
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if conf.MIGRATE_ON_STARTUP:
+        await run_in_threadpool(migrate, engine)
+    if conf.DATABASE_WARMUP:
+        await warm_pool()
+
+    tasks = [asyncio.create_task(invalidation_listener.run())]
+    if conf.OVERDUE_SWEEP_INTERVAL > 0:
+        tasks.append(asyncio.create_task(run_sweeper(conf.OVERDUE_SWEEP_INTERVAL)))
+    if conf.METRICS_DIR:
+        tasks.append(asyncio.create_task(run_snapshots(conf.METRICS_SNAPSHOT_INTERVAL)))
+    yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # THE SERVER HAS DRAINED THE IN-FLIGHT REQUESTS BY NOW, THE POOLED CONNECTIONS ARE CLOSED INSTEAD OF DROPPED
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+app = FastAPI(title="DBS", lifespan=lifespan, default_response_class=ORJSONResponse if conf.FAST_SERIALIZATION else JSONResponse)
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    return Response("Invalid data", status_code=status.HTTP_400_BAD_REQUEST)
+
+app.include_router(router)
+
+if conf.INSTRUMENTATION:
+    instrument_engine(engine)
+    if async_engine is not None:
+        instrument_engine(async_engine.sync_engine)
+app.add_middleware(QueryCountMiddleware, headers=conf.INSTRUMENTATION)
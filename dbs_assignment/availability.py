@@ -0,0 +1,134 @@
+import hashlib
+import time
+from sqlalchemy import select, exists, func, and_, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from .models import Publication, Instance, instance_types, availability_counts
+
+# A PUBLICATION AND TYPE IS COUNTED IN UP TO COUNTER_SHARDS ROWS, AN INSTANCE ALWAYS IN THE SAME ONE
+# PARALLEL CHECKOUTS OF ONE TITLE CLAIM DIFFERENT COPIES AND SO MOSTLY LOCK DIFFERENT ROWS UNTIL THEY COMMIT
+# THE SAME HASH AS 0010_availability_shards, CHANGING THE NUMBER NEEDS A MIGRATION THAT REBUILDS THE TABLE
+COUNTER_SHARDS = 8
+
+def counter_shard(instance_id: str) -> int:
+    return hashlib.md5(instance_id.encode()).digest()[15] % COUNTER_SHARDS
+
+def counter_shard_column(instance_id):
+    return func.get_byte(func.decode(func.md5(instance_id), "hex"), 15) % COUNTER_SHARDS
+
+# +1 / -1 OF ONE INSTANCE FOR THE COUNTERS OF ITS PUBLICATION AND TYPE
+def instance_delta(instance_id: str, publication_id: str, type: str, status: str, sign: int = 1):
+    return (publication_id, type, counter_shard(instance_id), sign, sign if status == "available" else 0)
+
+# ADDS (publication_id, type, shard, total, available) DELTAS IN THE CALLER'S TRANSACTION, ONE MULTI ROW UPSERT
+# KEYS ARE WRITTEN IN A FIXED ORDER SO TWO TRANSACTIONS NEVER LOCK THE SAME COUNTERS IN OPPOSITE ORDER
+async def adjust_availability(db, deltas):
+    summed = {}
+    for publication_id, type, shard, total, available in deltas:
+        counts = summed.setdefault((publication_id, type, shard), [0, 0])
+        counts[0] += total
+        counts[1] += available
+
+    rows = [{"publication_id": publication_id, "type": type, "shard": shard, "total": total, "available": available}
+            for (publication_id, type, shard), (total, available) in sorted(summed.items()) if total or available]
+    if not rows:
+        return
+
+    statement = insert(availability_counts)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[availability_counts.c.publication_id, availability_counts.c.type, availability_counts.c.shard],
+        set_={"total": availability_counts.c.total + statement.excluded.total,
+              "available": availability_counts.c.available + statement.excluded.available}), rows)
+
+# LOCKED COPIES ARE SKIPPED, PARALLEL CHECKOUTS OF ONE TITLE EACH GET A DIFFERENT COPY WITHOUT WAITING
+async def claim_available_instance(db, publication_id: str):
+    instance = await db.scalar(select(Instance).where(
+        Instance.publication_id == publication_id,
+        Instance.status == "available").limit(1).with_for_update(skip_locked=True))
+    if instance is not None:
+        instance.status = "reserved"
+        await adjust_availability(db, [(instance.publication_id, instance.type, counter_shard(instance.id), 0, -1)])
+    return instance
+
+async def has_available_instance(db, publication_id: str) -> bool:
+    return await db.scalar(select(exists().where(
+        Instance.publication_id == publication_id,
+        Instance.status == "available")))
+
+async def count_availability(db, publication_id: str):
+    rows = (await db.execute(select(
+        availability_counts.c.type,
+        func.sum(availability_counts.c.total),
+        func.sum(availability_counts.c.available))
+        .where(availability_counts.c.publication_id == publication_id)
+        .group_by(availability_counts.c.type))).all()
+
+    types = {instance_type: {"total": 0, "available": 0} for instance_type in instance_types}
+    for instance_type, total, available in rows:
+        types[instance_type] = {"total": total, "available": available}
+
+    return {
+        "publication_id": publication_id,
+        "total": sum(counts["total"] for counts in types.values()),
+        "available": sum(counts["available"] for counts in types.values()),
+        "types": types
+    }
+
+# None WHEN THE PUBLICATION DOES NOT EXIST
+async def publication_availability(db, publication_id: str):
+    db_item = await db.scalar(select(Publication.id).where(Publication.id == publication_id))
+    if db_item is None:
+        return None
+    return await count_availability(db, publication_id)
+
+# CORRELATED SUBQUERIES FOR with_expression, LISTS GET THE COUNTS IN THE SAME ROUND TRIP AS THE PAGE
+def availability_columns():
+    def column(counter):
+        return (select(func.coalesce(func.sum(counter), 0))
+            .where(availability_counts.c.publication_id == Publication.id)
+            .correlate(Publication).scalar_subquery())
+    return column(availability_counts.c.total), column(availability_counts.c.available)
+
+# RECOMPUTES THE COUNTERS FROM instances AND RETURNS THE ROWS THAT HAD DRIFTED, fix=False ONLY REPORTS
+# THE TABLE LOCK WAITS FOR WRITERS THAT ALREADY ADJUSTED COUNTERS AND HOLDS OFF NEW ONES UNTIL THE COMMIT
+async def reconcile_availability(db, fix: bool = True):
+    started = time.perf_counter()
+    await db.execute(text("LOCK TABLE availability_counts IN EXCLUSIVE MODE"))
+
+    shard = counter_shard_column(Instance.id)
+    actual = select(
+        Instance.publication_id,
+        Instance.type,
+        shard.label("shard"),
+        func.count().label("total"),
+        func.count().filter(Instance.status == "available").label("available")
+    ).group_by(Instance.publication_id, Instance.type, shard).subquery()
+    stored = availability_counts
+
+    stored_total, stored_available = func.coalesce(stored.c.total, 0), func.coalesce(stored.c.available, 0)
+    actual_total, actual_available = func.coalesce(actual.c.total, 0), func.coalesce(actual.c.available, 0)
+    drifted = (await db.execute(select(
+        func.coalesce(actual.c.publication_id, stored.c.publication_id),
+        func.coalesce(actual.c.type, stored.c.type),
+        func.coalesce(actual.c.shard, stored.c.shard),
+        stored_total, stored_available, actual_total, actual_available)
+        .select_from(actual.join(stored, and_(
+            actual.c.publication_id == stored.c.publication_id,
+            actual.c.type == stored.c.type,
+            actual.c.shard == stored.c.shard), full=True))
+        .where(or_(stored_total != actual_total, stored_available != actual_available)))).all()
+
+    rows = [{"publication_id": publication_id, "type": type, "shard": shard, "stored": {"total": stored_total, "available": stored_available},
+             "actual": {"total": actual_total, "available": actual_available}}
+            for publication_id, type, shard, stored_total, stored_available, actual_total, actual_available in drifted]
+
+    if fix and rows:
+        statement = insert(availability_counts)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[availability_counts.c.publication_id, availability_counts.c.type, availability_counts.c.shard],
+            set_={"total": statement.excluded.total, "available": statement.excluded.available}),
+            [{"publication_id": row["publication_id"], "type": row["type"], "shard": row["shard"], **row["actual"]} for row in rows])
+        await db.commit()
+    else:
+        await db.rollback()
+
+    return {"drifted": len(rows), "fixed": fix and bool(rows), "rows": rows, "seconds": round(time.perf_counter() - started, 3)}
@@ -0,0 +1,114 @@
+import inspect
+import logging
+from contextlib import AsyncExitStack
+import orjson
+from starlette.requests import Request
+from .database import batch_session
+
+logger = logging.getLogger(__name__)
+
+METHODS = {"GET", "POST", "PATCH", "PUT", "DELETE"}
+
+# EVERY OPERATION RUNS IN A SAVEPOINT, A HANDLER'S commit() RELEASES IT AND OPENS THE NEXT ONE AND rollback() UNDOES
+# THE WORK SINCE ITS LAST commit(), SO EACH HANDLER BEHAVES AS WITH ITS OWN SESSION AND ONLY THE BATCH REALLY COMMITS
+class BatchSession:
+    def __init__(self, db):
+        self.db = db
+        self.savepoint = None
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    async def begin(self):
+        self.savepoint = await self.db.begin_nested()
+
+    async def commit(self):
+        await self.savepoint.commit()
+        await self.begin()
+
+    async def rollback(self):
+        await self.savepoint.rollback()
+        await self.begin()
+
+    async def close(self):
+        pass
+
+def exception_handler(app, exc: Exception):
+    for cls in type(exc).__mro__:
+        if cls in app.exception_handlers:
+            return app.exception_handlers[cls]
+    return None
+
+def response_body(headers: list, body: bytes):
+    if not body:
+        return None
+    if dict(headers).get(b"content-type", b"").startswith(b"application/json"):
+        return orjson.loads(body)
+    return body.decode()
+
+# ONE OPERATION THROUGH THE ROUTER LIKE A REQUEST OF ITS OWN, HTTPException AND VALIDATION ERRORS BECOME THE SAME
+# RESPONSES THE APP'S EXCEPTION HANDLERS GIVE, ANYTHING ELSE IS A 500 OF THIS OPERATION ONLY
+async def dispatch(app, scope: dict, method: str, path: str, body):
+    path, _, query = path.partition("?")
+    raw = orjson.dumps(body) if body is not None else b""
+    operation_scope = {key: value for key, value in scope.items() if key not in ("endpoint", "path_params", "route", "router", "fastapi_astack")}
+    operation_scope.update(method=method, path=path, raw_path=path.encode(), query_string=query.encode(),
+        headers=[(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode())])
+
+    received = False
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    response = {"status": 500, "headers": [], "body": b""}
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    try:
+        async with AsyncExitStack() as stack:
+            operation_scope["fastapi_astack"] = stack
+            await app.router(operation_scope, receive, send)
+    except Exception as exc:
+        handler = exception_handler(app, exc)
+        if handler is None:
+            logger.exception("batch operation %s %s failed", method, path)
+            return 500, {"detail": "Internal Server Error"}
+        result = handler(Request(operation_scope, receive), exc)
+        result = await result if inspect.isawaitable(result) else result
+        return result.status_code, response_body(result.raw_headers, result.body)
+
+    return response["status"], response_body(response["headers"], response["body"])
+
+# OPERATIONS IN ORDER IN ONE SESSION AND ONE TRANSACTION, A FAILED OPERATION (STATUS >= 400) IS ROLLED BACK TO ITS
+# SAVEPOINT AND THE REST GO ON, atomic ROLLS BACK EVERYTHING AT THE FIRST FAILURE AND SKIPS THE REMAINING OPERATIONS
+async def run_batch(app, scope: dict, db, operations: list, atomic: bool = False):
+    session = BatchSession(db)
+    token = batch_session.set(session)
+    results = []
+    try:
+        for operation in operations:
+            await session.begin()
+            status, body = await dispatch(app, scope, operation.method.upper(), operation.path, operation.body)
+            results.append({"status": status, "body": body})
+            if status >= 400:
+                await session.savepoint.rollback()
+                if atomic:
+                    await db.rollback()
+                    return {"committed": False, "results": results}
+            else:
+                await session.savepoint.commit()
+            # LIKE SEPARATE REQUESTS, NO OPERATION SEES OBJECTS AN EARLIER ONE LEFT IN THE SESSION
+            db.expunge_all()
+
+        await db.commit()
+    finally:
+        batch_session.reset(token)
+
+    return {"committed": True, "results": results}
@@ -0,0 +1,259 @@
+import csv
+import io
+import json
+import time
+import uuid
+from fastapi import status, HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from .models import Author, Category, Publication, Instance, publications_authors, publications_categories
+from .schemas import AuthorRequest, CategoryRequest, PublicationRequest, InstanceRequest
+from .references import author_keys, resolve_references, missing_references
+from .availability import adjust_availability, instance_delta
+
+BULK_FORMATS = ["ndjson", "csv"]
+BULK_BATCH_SIZE = 1000
+
+# ONE REJECTED INPUT ROW, THE REST OF ITS BATCH IS STILL WRITTEN
+class RowError(Exception):
+    pass
+
+def validation_message(error) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+    if isinstance(error, HTTPException):
+        return "invalid data"
+    return f"invalid data: {error.__class__.__name__} {error}"
+
+# CSV CELLS ARE FLAT, EMPTY CELLS ARE LEFT OUT, LISTS ARE ';' SEPARATED
+# AND AN AUTHOR IS 'NAME SURNAME' SPLIT ON THE LAST SPACE
+def csv_author(value: str):
+    name, _, surname = value.strip().rpartition(" ")
+    return {"name": name, "surname": surname}
+
+def csv_list(value):
+    return [item.strip() for item in (value or "").split(";") if item.strip()]
+
+def csv_record(resource: str, record: dict) -> dict:
+    record = {key: value for key, value in record.items() if key is not None and value not in ("", None)}
+    if resource == "publications":
+        record["authors"] = [csv_author(author) for author in csv_list(record.get("authors"))]
+        record["categories"] = csv_list(record.get("categories"))
+    return record
+
+# YIELDS (LINE, RECORD) WHERE RECORD IS A DICT OR THE RowError THAT REJECTED THE LINE
+def parse_records(resource: str, text: str, format: str):
+    if format == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for record in reader:
+            yield reader.line_num, csv_record(resource, record)
+        return
+
+    for line, raw in enumerate(text.splitlines(), start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as error:
+            yield line, RowError(f"invalid json: {error}")
+            continue
+        if not isinstance(record, dict):
+            yield line, RowError("invalid json: expected an object")
+            continue
+        yield line, record
+
+# FORMAT COMES FROM ?format= OR THE CONTENT TYPE, NDJSON OTHERWISE
+async def read_body(request, format):
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    try:
+        return (await request.body()).decode("utf-8-sig"), format
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+def batches(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# MULTI ROW INSERT, ROWS A CONCURRENT WRITER INSERTED FIRST ARE SKIPPED AND REPORTED BY THE CALLER
+async def insert_rows(db, table, rows: list) -> set:
+    if not rows:
+        return set()
+    result = await db.execute(insert(table).on_conflict_do_nothing().returning(table.c.id), rows)
+    return set(result.scalars().all())
+
+async def insert_links(db, table, rows: list):
+    if rows:
+        await db.execute(insert(table).on_conflict_do_nothing(), rows)
+
+# RESOURCE WRITERS, EACH RESOLVES CONFLICTS AND REFERENCES FOR THE WHOLE BATCH WITH SET BASED QUERIES
+# AND RETURNS THE REJECTED ROWS AS (LINE, ID, MESSAGE)
+async def write_categories(db, batch: list) -> list:
+    ids = {item.id for _, item in batch}
+    names = {item.name for _, item in batch}
+    taken = (await db.execute(select(Category.id, Category.name).where(
+        or_(Category.id.in_(ids), Category.name.in_(names))))).all()
+    taken_ids = {row.id for row in taken}
+    taken_names = {row.name for row in taken}
+
+    errors, rows = [], []
+    for line, item in batch:
+        if item.id in taken_ids or item.name in taken_names:
+            errors.append((line, item.id, "conflict"))
+            continue
+        taken_ids.add(item.id)
+        taken_names.add(item.name)
+        rows.append({"id": item.id, "name": item.name})
+
+    inserted = await insert_rows(db, Category.__table__, rows)
+    errors += [(None, row["id"], "conflict") for row in rows if row["id"] not in inserted]
+    return errors
+
+async def write_authors(db, batch: list) -> list:
+    ids = {item.id for _, item in batch}
+    names = {(item.name, item.surname) for _, item in batch}
+    taken = (await db.execute(select(Author.id, Author.name, Author.surname).where(
+        or_(Author.id.in_(ids), tuple_(Author.name, Author.surname).in_(names))))).all()
+    taken_ids = {row.id for row in taken}
+    taken_names = {(row.name, row.surname) for row in taken}
+
+    errors, rows = [], []
+    for line, item in batch:
+        if item.id in taken_ids or (item.name, item.surname) in taken_names:
+            errors.append((line, item.id, "conflict"))
+            continue
+        taken_ids.add(item.id)
+        taken_names.add((item.name, item.surname))
+        rows.append({"id": item.id, "name": item.name, "surname": item.surname})
+
+    inserted = await insert_rows(db, Author.__table__, rows)
+    errors += [(None, row["id"], "conflict") for row in rows if row["id"] not in inserted]
+    return errors
+
+async def write_publications(db, batch: list) -> list:
+    ids = {item.id for _, item in batch}
+    taken_ids = set((await db.scalars(select(Publication.id).where(Publication.id.in_(ids)))).all())
+    authors, categories = await resolve_references(db,
+        [author for _, item in batch for author in item.authors],
+        [category for _, item in batch for category in item.categories])
+
+    errors, rows, author_links, category_links = [], [], [], []
+    for line, item in batch:
+        if item.id in taken_ids:
+            errors.append((line, item.id, "conflict"))
+            continue
+        missing = missing_references(item.authors, item.categories, authors, categories)
+        if missing:
+            errors.append((line, item.id, f"unknown references: {', '.join(missing)}"))
+            continue
+        taken_ids.add(item.id)
+        rows.append({"id": item.id, "title": item.title})
+        author_links += [{"publication_id": item.id, "author_id": authors[key]} for key in author_keys(item.authors)]
+        category_links += [{"publication_id": item.id, "category_id": categories[category]} for category in dict.fromkeys(item.categories)]
+
+    inserted = await insert_rows(db, Publication.__table__, rows)
+    await insert_links(db, publications_authors, [link for link in author_links if link["publication_id"] in inserted])
+    await insert_links(db, publications_categories, [link for link in category_links if link["publication_id"] in inserted])
+    errors += [(None, row["id"], "conflict") for row in rows if row["id"] not in inserted]
+    return errors
+
+async def write_instances(db, batch: list) -> list:
+    ids = {item.id for _, item in batch}
+    publication_ids = {item.publication_id for _, item in batch}
+    taken_ids = set((await db.scalars(select(Instance.id).where(Instance.id.in_(ids)))).all())
+    publications = set((await db.scalars(select(Publication.id).where(Publication.id.in_(publication_ids)))).all())
+
+    errors, rows = [], []
+    for line, item in batch:
+        if item.id in taken_ids:
+            errors.append((line, item.id, "conflict"))
+            continue
+        if item.publication_id not in publications:
+            errors.append((line, item.id, f"unknown publication: {item.publication_id}"))
+            continue
+        taken_ids.add(item.id)
+        rows.append({"id": item.id, "type": item.type, "publisher": item.publisher, "year": item.year,
+                     "status": item.status, "publication_id": item.publication_id})
+
+    inserted = await insert_rows(db, Instance.__table__, rows)
+    await adjust_availability(db, [instance_delta(row["id"], row["publication_id"], row["type"], row["status"]) for row in rows if row["id"] in inserted])
+    errors += [(None, row["id"], "conflict") for row in rows if row["id"] not in inserted]
+    return errors
+
+def check_instance(item: InstanceRequest):
+    missing = [field for field in ("type", "publisher", "year", "publication_id") if getattr(item, field) is None]
+    if missing:
+        raise RowError(f"missing fields: {', '.join(missing)}")
+
+IMPORTERS = {
+    "categories": (CategoryRequest, write_categories, None),
+    "authors": (AuthorRequest, write_authors, None),
+    "publications": (PublicationRequest, write_publications, None),
+    "instances": (InstanceRequest, write_instances, check_instance),
+}
+
+def validate_record(resource: str, record):
+    schema, _, check = IMPORTERS[resource]
+    if isinstance(record, RowError):
+        raise record
+    try:
+        item = schema(**record)
+    except (ValidationError, HTTPException, LookupError, TypeError) as error:
+        raise RowError(validation_message(error))
+    if item.id is None:
+        item.id = str(uuid.uuid4())
+    if check is not None:
+        check(item)
+    return item
+
+# VALIDATES AND WRITES text IN BATCHES, ONE TRANSACTION PER BATCH, BAD ROWS ARE REPORTED AND SKIPPED
+async def import_records(db, resource: str, text: str, format: str = "ndjson", batch_size: int = BULK_BATCH_SIZE):
+    _, write, _ = IMPORTERS[resource]
+    started = time.perf_counter()
+    received = inserted = 0
+    errors = []
+
+    for batch in batches(parse_records(resource, text, format), batch_size):
+        valid = []
+        for line, record in batch:
+            try:
+                valid.append((line, validate_record(resource, record)))
+            except RowError as error:
+                errors.append({"line": line, "id": record.get("id") if isinstance(record, dict) else None, "error": str(error)})
+        received += len(batch)
+        if not valid:
+            continue
+
+        lines = {item.id: line for line, item in valid}
+        try:
+            rejected = await write(db, valid)
+            await db.commit()
+        except DBAPIError as error:
+            await db.rollback()
+            message = f"batch failed: {str(error.orig).strip()}"
+            errors += [{"line": line, "id": item.id, "error": message} for line, item in valid]
+            continue
+
+        errors += [{"line": line or lines.get(id), "id": id, "error": message} for line, id, message in rejected]
+        inserted += len(valid) - len(rejected)
+
+    seconds = time.perf_counter() - started
+    return {
+        "resource": resource,
+        "received": received,
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": sorted(errors, key=lambda error: error["line"] or 0),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(inserted / seconds, 1) if seconds else 0.0,
+    }
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+import asyncpg
+from fastapi import status
+from fastapi.responses import Response
+from sqlalchemy import select, func
+from .configuration import conf
+from .serializers import render
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "reference_cache"
+LISTEN_RETRY_SECONDS = 5
+
+# LRU WITH A TTL PER ENTRY, None IS NEVER STORED SO IT MEANS A MISS
+# EVERY delete() AND clear() STARTS A NEW GENERATION AND REMEMBERS IT FOR THE KEYS IT INVALIDATED, A FILL TAKES generation()
+# BEFORE IT READS AND set() DROPS ITS VALUE IF ONE OF ITS KEY, ITS KIND OR THE WHOLE CACHE WAS INVALIDATED SINCE, THE READ
+# MAY HAVE SEEN THE ROW FROM BEFORE THE WRITE
+# ONLY THE LATEST maxsize INVALIDATED KEYS ARE REMEMBERED, A FILL OLDER THAN THE FORGOTTEN ONES IS DROPPED TOO
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.current = 0
+        self.invalidated = OrderedDict()
+        self.forgotten = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self) -> int:
+        return self.current
+
+    def invalidate_generation(self, key):
+        self.invalidated[key] = self.current
+        self.invalidated.move_to_end(key)
+        while len(self.invalidated) > self.maxsize:
+            self.forgotten = self.invalidated.popitem(last=False)[1]
+
+    def invalidated_since(self, key, generation: int) -> bool:
+        return self.forgotten > generation or any(
+            self.invalidated.get(scope, 0) > generation for scope in (key, key[:1], ()))
+
+    def set(self, key, value, generation: int = None):
+        if generation is not None and self.invalidated_since(key, generation):
+            self.stale_fills += 1
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # A ONE ELEMENT KEY LIKE ("publication",) DROPS EVERY ENTRY OF THAT KIND
+    def delete(self, *keys):
+        self.current += 1
+        for key in keys:
+            self.invalidate_generation(key)
+            if len(key) == 1:
+                for entry in [entry for entry in self.entries if entry[0] == key[0]]:
+                    del self.entries[entry]
+                    self.invalidations += 1
+            elif self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        self.current += 1
+        self.invalidate_generation(())
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_fills": self.stale_fills,
+        }
+
+# NATURAL KEYS OF CATEGORIES AND AUTHORS MAPPED TO THEIR ID
+reference_cache = TTLCache(conf.REFERENCE_CACHE_SIZE, conf.REFERENCE_CACHE_TTL)
+# SERIALIZED DETAIL RESPONSES AND THEIR ETAG, KEYED BY (KIND, ID)
+response_cache = TTLCache(conf.RESPONSE_CACHE_SIZE, conf.RESPONSE_CACHE_TTL)
+
+# AUTHOR AND CATEGORY NAMES ARE PART OF EVERY PUBLICATION BODY
+def category_cache_keys(category_id: str, name: str):
+    return [("category", category_id), ("category_name", name), ("publication",)]
+
+def author_cache_keys(author_id: str, name: str, surname: str):
+    return [("author", author_id), ("author_name", name, surname), ("publication",)]
+
+# CALLED BEFORE COMMIT, THE NOTIFICATION IS DELIVERED TO EVERY WORKER, THIS ONE INCLUDED, ONLY IF THE TRANSACTION COMMITS
+async def invalidate_cached(db, keys: list):
+    reference_cache.delete(*keys)
+    response_cache.delete(*keys)
+    await db.execute(select(func.pg_notify(INVALIDATION_CHANNEL, json.dumps(keys))))
+
+# THE BODY IS RENDERED EXACTLY AS THE ROUTE WOULD RENDER response_model, THE ETAG IS A HASH OF IT
+# generation IS response_cache.generation() FROM BEFORE value WAS READ, THE ENTRY IS NOT STORED IF A WRITE OVERTOOK THE READ
+def cache_response(key: tuple, schema, value, generation: int):
+    body = render(schema, value)
+    entry = (f'"{hashlib.sha1(body).hexdigest()}"', body)
+    response_cache.set(key, entry, generation)
+    return entry
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def conditional_response(request, entry):
+    etag, body = entry
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+def receive_invalidation(connection, pid, channel, payload):
+    try:
+        keys = [tuple(key) for key in json.loads(payload)]
+    except (ValueError, TypeError):
+        logger.warning("ignoring malformed cache invalidation %r", payload)
+        return
+    reference_cache.delete(*keys)
+    response_cache.delete(*keys)
+
+class InvalidationListener:
+    def __init__(self):
+        self.connected = False
+        self.reconnects = 0
+
+    async def connect(self):
+        return await asyncpg.connect(
+            host=conf.DATABASE_HOST, port=conf.DATABASE_PORT, database=conf.DATABASE_NAME,
+            user=conf.DATABASE_USER, password=conf.DATABASE_PASSWORD, timeout=conf.DATABASE_CONNECT_TIMEOUT)
+
+    # ONE DEDICATED CONNECTION PER WORKER, EVERYTHING CACHED IS DROPPED AFTER A RECONNECT
+    # BECAUSE NOTIFICATIONS SENT WHILE DISCONNECTED ARE LOST
+    async def run(self):
+        while True:
+            try:
+                connection = await self.connect()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as error:
+                logger.warning("cache invalidation listener cannot connect: %s", error)
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+                continue
+
+            try:
+                await connection.add_listener(INVALIDATION_CHANNEL, receive_invalidation)
+                reference_cache.clear()
+                response_cache.clear()
+                self.connected = True
+                while not connection.is_closed():
+                    await asyncio.sleep(LISTEN_RETRY_SECONDS)
+            except (OSError, asyncpg.PostgresError) as error:
+                logger.warning("cache invalidation listener lost its connection: %s", error)
+            finally:
+                self.connected = False
+                connection.terminate()
+            self.reconnects += 1
+
+invalidation_listener = InvalidationListener()
+
+def cache_stats():
+    return {
+        "references": reference_cache.stats(),
+        "responses": response_cache.stats(),
+        "listening": invalidation_listener.connected,
+        "reconnects": invalidation_listener.reconnects,
+    }
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# python -m dbs_assignment <command>
+
+def migrateCommand(args):
+    from .database import engine
+    from .migrations import migrate
+
+    applied = migrate(engine)
+    if applied:
+        for version in applied:
+            print(f"applied {version}")
+    else:
+        print("schema is up to date")
+
+async def importFile(args):
+    from .bulk import import_records
+    from .database import SessionLocal, async_engine
+
+    format = args.format or ("csv" if args.file.suffix == ".csv" else "ndjson")
+    db = SessionLocal()
+    try:
+        return await import_records(db, args.resource, args.file.read_text(encoding="utf-8-sig"), format, args.batch_size)
+    finally:
+        await db.close()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+def importCommand(args):
+    result = asyncio.run(importFile(args))
+
+    for error in result["errors"]:
+        print(f"line {error['line']} id {error['id']}: {error['error']}", file=sys.stderr)
+    print(f"{result['resource']}: {result['inserted']}/{result['received']} rows inserted, {result['failed']} failed, "
+          f"{result['seconds']}s, {result['rows_per_second']} rows/s")
+    if result["failed"]:
+        sys.exit(1)
+
+async def sweepOnce():
+    from .sweeper import sweep_once
+    from .database import async_engine
+
+    try:
+        return await sweep_once()
+    finally:
+        if async_engine is not None:
+            await async_engine.dispose()
+
+def sweepCommand(args):
+    result = asyncio.run(sweepOnce())
+    if result["updated"] is None:
+        print(f"another sweep is running, skipped after {result['seconds']}s")
+    else:
+        print(f"{result['updated']} rentals marked overdue in {result['seconds']}s")
+
+async def reconcileCounts(args):
+    from .availability import reconcile_availability
+    from .database import SessionLocal, async_engine
+
+    db = SessionLocal()
+    try:
+        return await reconcile_availability(db, fix=not args.dry_run)
+    finally:
+        await db.close()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+def reconcileCommand(args):
+    result = asyncio.run(reconcileCounts(args))
+
+    for row in result["rows"]:
+        stored, actual = row["stored"], row["actual"]
+        print(f"{row['publication_id']} {row['type']} shard {row['shard']}: stored {stored['available']}/{stored['total']}, "
+              f"actual {actual['available']}/{actual['total']}")
+    action = "fixed" if result["fixed"] else "found"
+    print(f"{action} {result['drifted']} drifted availability counters in {result['seconds']}s")
+
+# WORKER PROCESSES UNDER ONE SUPERVISOR, SIGTERM STOPS ACCEPTING CONNECTIONS AND EVERY WORKER FINISHES ITS IN-FLIGHT
+# REQUESTS (UP TO SERVER_GRACEFUL_TIMEOUT) BEFORE ITS LIFESPAN CLOSES THE POOL
+def serveCommand(args):
+    import uvicorn
+    from .configuration import conf
+    from .database import worker_count, pool_size, max_overflow
+
+    if args.migrate:
+        migrateCommand(args)
+
+    workers = worker_count()
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    host, port = args.host or conf.SERVER_HOST, args.port or conf.SERVER_PORT
+    print(f"serving on {host}:{port} with {workers} workers, {loop} event loop, {http} parser, "
+          f"{pool_size} + {max_overflow} overflow pooled connections per worker", file=sys.stderr)
+
+    # THE WORKERS INHERIT METRICS_DIR, SNAPSHOTS OF AN EARLIER RUN WOULD BE ADDED TO THE NEW TOTALS
+    metrics_dir = conf.METRICS_DIR
+    if metrics_dir:
+        for path in Path(metrics_dir).glob("*.json"):
+            path.unlink()
+    elif workers > 1:
+        metrics_dir = os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="dbs-metrics-")
+
+    try:
+        uvicorn.run("dbs_assignment.app:app", host=host, port=port, workers=workers, loop=loop, http=http,
+            backlog=conf.SERVER_BACKLOG, timeout_keep_alive=conf.SERVER_KEEPALIVE,
+            limit_concurrency=conf.SERVER_LIMIT_CONCURRENCY or None, timeout_graceful_shutdown=conf.SERVER_GRACEFUL_TIMEOUT,
+            access_log=conf.SERVER_ACCESS_LOG, server_header=False)
+    finally:
+        if metrics_dir and not conf.METRICS_DIR:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dbs_assignment")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="apply pending schema migrations")
+    migrate_parser.set_defaults(handler=migrateCommand)
+
+    import_parser = commands.add_parser("import", help="bulk load catalog data from NDJSON or CSV")
+    import_parser.add_argument("resource", choices=["categories", "authors", "publications", "instances"])
+    import_parser.add_argument("file", type=Path)
+    import_parser.add_argument("--format", choices=["ndjson", "csv"], help="taken from the file extension when omitted")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.set_defaults(handler=importCommand)
+
+    sweep_parser = commands.add_parser("sweep", help="mark active rentals past their end date as overdue")
+    sweep_parser.set_defaults(handler=sweepCommand)
+
+    reconcile_parser = commands.add_parser("reconcile", help="recompute the availability counters from the instances")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="only report the drift")
+    reconcile_parser.set_defaults(handler=reconcileCommand)
+
+    serve_parser = commands.add_parser("serve", help="run the production server, workers and limits come from the SERVER_ settings")
+    serve_parser.add_argument("--host", help="defaults to SERVER_HOST")
+    serve_parser.add_argument("--port", type=int, help="defaults to SERVER_PORT")
+    serve_parser.add_argument("--migrate", action="store_true", help="apply pending migrations once before the workers start")
+    serve_parser.set_defaults(handler=serveCommand)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
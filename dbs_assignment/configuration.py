@@ -12,4 +12,65 @@ class MySettings(BaseSettings):
     DATABASE_USER: str
     DATABASE_PASSWORD: str
 
+    # asyncpg engine when true, blocking psycopg2 engine driven from a threadpool when false
+    DATABASE_ASYNC: bool = True
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: int = 30
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_CONNECT_TIMEOUT: int = 10
+    # connections all server workers together may open, 0 lets every worker open DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW
+    DATABASE_CONNECTION_BUDGET: int = 0
+    # every worker opens its DATABASE_POOL_SIZE connections when it starts instead of on the first requests
+    DATABASE_WARMUP: bool = True
+    # applies pending migrations when a worker starts, otherwise python -m dbs_assignment migrate runs before the server
+    MIGRATE_ON_STARTUP: bool = False
+
+    # categories and authors, per worker, invalidated across workers with LISTEN/NOTIFY
+    REFERENCE_CACHE_SIZE: int = 10000
+    REFERENCE_CACHE_TTL: int = 300
+    RESPONSE_CACHE_SIZE: int = 10000
+    RESPONSE_CACHE_TTL: int = 60
+
+    # precomputed serializers and orjson for response bodies, false validates them through the pydantic response models
+    FAST_SERIALIZATION: bool = True
+
+    # seconds between overdue rental sweeps in every worker, 0 leaves it to python -m dbs_assignment sweep
+    OVERDUE_SWEEP_INTERVAL: int = 60
+
+    # search results past which the availability facets are counted over a sample and scaled up
+    SEARCH_FACET_LIMIT: int = 10000
+    # work_mem of search transactions, ranking a common word aggregates every publication it matches
+    SEARCH_WORK_MEM: str = "32MB"
+    # filtered publications past which the category, author, type and year facets are counted over a sample and scaled up
+    PUBLICATION_FACET_LIMIT: int = 5000
+
+    # query count, DB time and rows per request and per route and the X-Query-Count and Server-Timing headers, false leaves
+    # the engines without hooks, latency and status codes per route are counted either way
+    INSTRUMENTATION: bool = True
+    # statements slower than this are logged with the shape of their parameters, 0 disables the log
+    SLOW_QUERY_MS: int = 200
+
+    # directory every worker writes its metrics to so GET /metrics adds up all workers, serve with several workers creates one
+    METRICS_DIR: str = ""
+    METRICS_SNAPSHOT_INTERVAL: float = 1.0
+
+    # python -m dbs_assignment serve, 0 workers is one per CPU core the process may run on, never more than
+    # DATABASE_CONNECTION_BUDGET leaves a pooled connection for
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE: int = 5
+    # requests one worker serves at once before it answers 503, 0 is no limit
+    SERVER_LIMIT_CONCURRENCY: int = 0
+    # seconds a stopping worker waits for its in-flight requests
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_ACCESS_LOG: bool = False
+
+    # operations accepted by one POST /batch
+    BATCH_MAX_OPERATIONS: int = 100
+
 conf = MySettings()
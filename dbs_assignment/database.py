@@ -1,11 +1,204 @@
+import asyncio
+import logging
+import os
+import time
+from contextvars import ContextVar
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dbs_assignment.configuration import conf
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = f"postgresql://{conf.DATABASE_USER}:{conf.DATABASE_PASSWORD}@{conf.DATABASE_HOST}:{conf.DATABASE_PORT}/{conf.DATABASE_NAME}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{conf.DATABASE_USER}:{conf.DATABASE_PASSWORD}@{conf.DATABASE_HOST}:{conf.DATABASE_PORT}/{conf.DATABASE_NAME}"
+
+# CONNECTIONS A WORKER OPENS OUTSIDE ITS POOL, THE CACHE INVALIDATION LISTENER'S AND THE OVERDUE SWEEPER'S
+def reserved_connections():
+    return 1 + (conf.OVERDUE_SWEEP_INTERVAL > 0)
+
+# CORES THIS PROCESS MAY RUN ON, IN A CONTAINER OR UNDER taskset FEWER THAN THE HOST HAS
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# NO MORE WORKERS THAN DATABASE_CONNECTION_BUDGET GIVES EVERY ONE ITS RESERVED CONNECTIONS AND ONE POOLED
+def worker_count():
+    workers = conf.SERVER_WORKERS or available_cpus()
+    if conf.DATABASE_CONNECTION_BUDGET:
+        workers = min(workers, max(conf.DATABASE_CONNECTION_BUDGET // (reserved_connections() + 1), 1))
+    return workers
+
+# EVERY WORKER GETS AN EQUAL SHARE OF DATABASE_CONNECTION_BUDGET, ITS RESERVED CONNECTIONS COME OUT OF IT AND THE POOL TAKES
+# THE REST, UP TO DATABASE_POOL_SIZE STEADY CONNECTIONS AND THE REMAINDER AS OVERFLOW
+def pool_budget():
+    if not conf.DATABASE_CONNECTION_BUDGET:
+        return conf.DATABASE_POOL_SIZE, conf.DATABASE_MAX_OVERFLOW
+    share = max(conf.DATABASE_CONNECTION_BUDGET // worker_count() - reserved_connections(), 1)
+    pool_size = min(conf.DATABASE_POOL_SIZE, share)
+    return pool_size, min(conf.DATABASE_MAX_OVERFLOW, share - pool_size)
+
+pool_size, max_overflow = pool_budget()
+pool_options = {
+    "pool_size": pool_size,
+    "max_overflow": max_overflow,
+    "pool_timeout": conf.DATABASE_POOL_TIMEOUT,
+    "pool_recycle": conf.DATABASE_POOL_RECYCLE,
+    "pool_pre_ping": conf.DATABASE_POOL_PRE_PING,
+}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"connect_timeout": conf.DATABASE_CONNECT_TIMEOUT}, **pool_options)
+SyncSessionLocal = sessionmaker(engine, expire_on_commit=False)
+
+# SERVER SIDE CURSOR, SAME partitions() INTERFACE AS AsyncResult
+class SyncStreamResult:
+    def __init__(self, result):
+        self.result = result
+
+    async def partitions(self, size):
+        while True:
+            rows = await run_in_threadpool(self.result.fetchmany, size)
+            if not rows:
+                break
+            yield rows
+
+    async def close(self):
+        await run_in_threadpool(self.result.close)
+
+# SAVEPOINT OF A SyncSession, SAME INTERFACE AS AsyncSessionTransaction
+class SyncTransaction:
+    def __init__(self, transaction):
+        self.transaction = transaction
+
+    async def commit(self):
+        await run_in_threadpool(self.transaction.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.transaction.rollback)
+
+# SAME AWAITABLE INTERFACE AS AsyncSession, EVERY BLOCKING CALL RUNS IN THE THREADPOOL
+class SyncSession:
+    def __init__(self, sync_session):
+        self.sync_session = sync_session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def connection(self):
+        return await run_in_threadpool(self.sync_session.connection)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        return SyncStreamResult(await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs))
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def begin_nested(self):
+        return SyncTransaction(await run_in_threadpool(self.sync_session.begin_nested))
+
+    def expunge_all(self):
+        self.sync_session.expunge_all()
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+if conf.DATABASE_ASYNC:
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, connect_args={"timeout": conf.DATABASE_CONNECT_TIMEOUT}, **pool_options)
+    SessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+else:
+    async_engine = None
+
+    def SessionLocal():
+        return SyncSession(SyncSessionLocal())
+
+# THE OVERDUE SWEEPER'S CONNECTION, OPENED FOR EVERY SWEEP AND CLOSED AFTER IT, A LONG SWEEP NEVER HOLDS A CONNECTION OF THE
+# REQUESTS' POOL
+if conf.DATABASE_ASYNC:
+    background_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, connect_args={"timeout": conf.DATABASE_CONNECT_TIMEOUT}, poolclass=NullPool)
+    BackgroundSessionLocal = async_sessionmaker(background_engine, expire_on_commit=False)
+else:
+    background_engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"connect_timeout": conf.DATABASE_CONNECT_TIMEOUT}, poolclass=NullPool)
+    SyncBackgroundSessionLocal = sessionmaker(background_engine, expire_on_commit=False)
+
+    def BackgroundSessionLocal():
+        return SyncSession(SyncBackgroundSessionLocal())
+
+# SET BY POST /batch, THE OPERATIONS OF ONE BATCH SHARE ITS SESSION AND THE BATCH CLOSES IT
+batch_session: ContextVar = ContextVar("batch_session", default=None)
+
+# ONE SESSION PER REQUEST, CONNECTION GOES BACK TO THE POOL EVEN WHEN THE HANDLER RAISES
+async def get_db():
+    db = batch_session.get()
+    if db is not None:
+        yield db
+        return
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+# OPENS THE pool_size CONNECTIONS AT ONCE AND RETURNS THEM TO THE POOL, SO THE FIRST REQUESTS OF A NEW WORKER DO
+# NOT PAY FOR THE HANDSHAKES, A DATABASE THAT IS NOT UP YET ONLY LOGS A WARNING AND THE POOL CONNECTS ON DEMAND
+async def warm_pool():
+    started = time.perf_counter()
+    try:
+        if async_engine is not None:
+            connections = await asyncio.gather(*(async_engine.connect() for _ in range(pool_size)))
+            for connection in connections:
+                await connection.close()
+        else:
+            connections = await asyncio.gather(*(run_in_threadpool(engine.connect) for _ in range(pool_size)))
+            for connection in connections:
+                connection.close()
+    except Exception as exc:
+        logger.warning("pool warm-up failed, connections will be opened on demand: %s", exc)
+        return None
+    seconds = round(time.perf_counter() - started, 3)
+    logger.info("opened %d pooled connections in %.3fs", pool_size, seconds)
+    return seconds
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(engine)
+def pool_status():
+    pool = async_engine.pool if async_engine is not None else engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+    }
 
 Base = declarative_base()
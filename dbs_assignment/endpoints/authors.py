@@ -1,20 +1,26 @@
-from fastapi import status, HTTPException, APIRouter
-from sqlalchemy import or_, and_
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query, Request
+from sqlalchemy import or_, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import Author
-from ..schemas import AuthorRequest, AuthorResponse, AuthorPatch
-from ..database import SessionLocal
+from ..schemas import AuthorRequest, AuthorResponse, AuthorPatch, Page, BulkResult
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights, fetch_row
+from ..cache import response_cache, author_cache_keys, invalidate_cached, cache_response, conditional_response
+from ..bulk import import_records, read_body
+from ..serializers import SerializingRoute
 
-authors_router = APIRouter(tags=['authors_router'])
+authors_router = APIRouter(tags=['authors_router'], route_class=SerializingRoute)
 
 @authors_router.post("/authors", response_model=AuthorResponse, status_code=status.HTTP_201_CREATED)
-async def authorCreate(new_author: AuthorRequest):
-    db = SessionLocal()
-    db_item = db.query(Author).filter(
+async def authorCreate(new_author: AuthorRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Author).where(
         or_(
             and_(
                 Author.name == new_author.name,
                 Author.surname == new_author.surname),
-            Author.id == new_author.id)).first()
+            Author.id == new_author.id)).limit(1))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -25,45 +31,70 @@ async def authorCreate(new_author: AuthorRequest):
     )
 
     db.add(author)
-    db.commit()
+    await db.commit()
 
     if author.name:
        return author
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@authors_router.post("/authors:bulk", response_model=BulkResult)
+async def authorBulk(request: Request, format: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    text, format = await read_body(request, format)
+
+    return await import_records(db, "authors", text, format)
+
+@authors_router.get("/authors", response_model=Page[AuthorResponse])
+async def authorList(surname: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    statement = select(Author)
+    if surname is not None:
+        statement = statement.where(Author.surname == surname)
+    items, next_cursor = await paginate(db, statement, Author.created_at, Author.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
 @authors_router.get("/authors/{author_id}", response_model=AuthorResponse)
-async def authorDetail(author_id: str):
-    db = SessionLocal()
-    db_item = db.query(Author).filter(Author.id==author_id).first()
-    if db_item is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+async def authorDetail(author_id: str, request: Request):
+    cached = response_cache.get(("author", author_id))
+    if cached is None:
+        generation = response_cache.generation()
+        db_item = await flights.do(("author", author_id), fetch_row, Author, author_id)
+        if db_item is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        cached = cache_response(("author", author_id), AuthorResponse, db_item, generation)
 
-    return db_item
+    return conditional_response(request, cached)
 
 @authors_router.delete("/authors/{author_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def authorDelete(author_id: str):
-    db = SessionLocal()
-    db_item = db.query(Author).filter(Author.id==author_id).first()
+async def authorDelete(author_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Author).where(Author.id==author_id))
 
     if db_item is not None:
-        db.delete(db_item)
-        db.commit()
+        await invalidate_cached(db, author_cache_keys(db_item.id, db_item.name, db_item.surname))
+        await db.delete(db_item)
+        await db.commit()
 
     return
 
 @authors_router.patch("/authors/{author_id}", response_model=AuthorResponse)
-async def authorUpdate(author_id: str, author_patch : AuthorPatch):
-    db = SessionLocal()
-    author = db.query(Author).filter(Author.id==author_id).first()
+async def authorUpdate(author_id: str, author_patch : AuthorPatch, db: AsyncSession = Depends(get_db)):
+    author = await db.scalar(select(Author).where(Author.id==author_id))
     if author is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
+    db_item = await db.scalar(select(Author.id).where(
+        Author.name == (author_patch.name or author.name),
+        Author.surname == (author_patch.surname or author.surname),
+        Author.id != author_id).limit(1))
+    if db_item is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT)
+
+    await invalidate_cached(db, author_cache_keys(author.id, author.name, author.surname))
     if author_patch.name:
         author.name = author_patch.name
     if author_patch.surname:
         author.surname = author_patch.surname
-    db.commit()
+    await db.commit()
 
     if author.name:
        return author
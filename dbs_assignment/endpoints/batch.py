@@ -0,0 +1,20 @@
+from fastapi import status, HTTPException, APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..schemas import BatchRequest, BatchResponse
+from ..database import get_db
+from ..configuration import conf
+from ..batch import run_batch, METHODS
+from ..serializers import SerializingRoute
+
+batch_router = APIRouter(tags=['batch_router'], route_class=SerializingRoute)
+
+# THE WHOLE BATCH IS CHECKED BEFORE THE FIRST OPERATION RUNS, A BATCH CANNOT CONTAIN ANOTHER BATCH
+@batch_router.post("/batch", response_model=BatchResponse)
+async def batchExecute(batch_request: BatchRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    if not 1 <= len(batch_request.operations) <= conf.BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    for operation in batch_request.operations:
+        if operation.method.upper() not in METHODS or not operation.path.startswith("/") or operation.path.partition("?")[0].rstrip("/") == "/batch":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    return await run_batch(request.app, request.scope, db, batch_request.operations, batch_request.atomic)
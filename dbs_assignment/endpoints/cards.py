@@ -1,18 +1,23 @@
-from fastapi import status, HTTPException, APIRouter
-from ..models import Card, User
-from ..schemas import CardRequest, CardResponse, CardPatch
-from ..database import SessionLocal
-
-cards_router = APIRouter(tags=['cards_router'])
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Card, User, card_statuses
+from ..schemas import CardRequest, CardResponse, CardPatch, Page
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights, fetch_row
+from ..serializers import SerializingRoute
+
+cards_router = APIRouter(tags=['cards_router'], route_class=SerializingRoute)
 
 @cards_router.post("/cards", response_model=CardResponse, status_code=status.HTTP_201_CREATED)
-async def cardCreate(new_card: CardRequest):
-    db = SessionLocal()
-    db_item = db.query(User).filter(User.id == new_card.user_id).first()
+async def cardCreate(new_card: CardRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(User).where(User.id == new_card.user_id))
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
-    db_item = db.query(Card).filter(Card.user_id == new_card.user_id).first()
+    db_item = await db.scalar(select(Card).where(Card.user_id == new_card.user_id).limit(1))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -24,51 +29,61 @@ async def cardCreate(new_card: CardRequest):
     )
 
     db.add(card)
-    db.commit()
+    await db.commit()
 
     if card.created_at:
        return card
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@cards_router.get("/cards", response_model=Page[CardResponse])
+async def cardList(user_id: Optional[str] = None, card_status: Optional[str] = Query(None, alias="status"), cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    statement = select(Card)
+    if user_id is not None:
+        statement = statement.where(Card.user_id == user_id)
+    if card_status is not None:
+        if card_status not in card_statuses:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+        statement = statement.where(Card.status == card_status)
+    items, next_cursor = await paginate(db, statement, Card.created_at, Card.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
 @cards_router.get("/cards/{card_id}", response_model=CardResponse)
 async def cardDetail(card_id: str):
-    db = SessionLocal()
-    db_item = db.query(Card).filter(Card.id==card_id).first()
+    db_item = await flights.do(("card", card_id), fetch_row, Card, card_id)
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    if db_item.created_at:
+    if db_item["created_at"]:
        return db_item
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @cards_router.delete("/cards/{card_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def cardDelete(card_id: str):
-    db = SessionLocal()
-    db_item = db.query(Card).filter(Card.id==card_id).first()
+async def cardDelete(card_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Card).where(Card.id==card_id))
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     if db_item is not None:
-        db.delete(db_item)
-        db.commit()
+        await db.delete(db_item)
+        await db.commit()
 
     return
 
 @cards_router.patch("/cards/{card_id}", response_model=CardResponse)
-async def cardUpdate(card_id: str, card_patch : CardPatch):
-    db = SessionLocal()
-    card = db.query(Card).filter(Card.id == card_id).first()
+async def cardUpdate(card_id: str, card_patch : CardPatch, db: AsyncSession = Depends(get_db)):
+    card = await db.scalar(select(Card).where(Card.id == card_id))
     if card is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     if card_patch.user_id:
-        db_item = db.query(User).filter(User.id==card_patch.user_id).first()
+        db_item = await db.scalar(select(User).where(User.id==card_patch.user_id))
         if db_item is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    db_item = db.query(Card).filter(Card.user_id == card_patch.user_id).first()
+    db_item = await db.scalar(select(Card).where(Card.user_id == card_patch.user_id).limit(1))
     if db_item is not None and card_id != db_item.id:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -76,7 +91,7 @@ async def cardUpdate(card_id: str, card_patch : CardPatch):
         card.status = card_patch.status
     if card_patch.user_id:
         card.user_id = card_patch.user_id
-    db.commit()
+    await db.commit()
 
     if card.created_at:
        return card
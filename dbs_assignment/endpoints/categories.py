@@ -1,18 +1,24 @@
-from fastapi import status, HTTPException, APIRouter
-from sqlalchemy import or_
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query, Request
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import Category
-from ..schemas import CategoryRequest, CategoryResponse
-from ..database import SessionLocal
+from ..schemas import CategoryRequest, CategoryResponse, Page, BulkResult
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights, fetch_row
+from ..cache import response_cache, category_cache_keys, invalidate_cached, cache_response, conditional_response
+from ..bulk import import_records, read_body
+from ..serializers import SerializingRoute
 
-categories_router = APIRouter(tags=['categories_router'])
+categories_router = APIRouter(tags=['categories_router'], route_class=SerializingRoute)
 
 @categories_router.post("/categories", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
-async def categoryCreate(new_category: CategoryRequest):
-    db = SessionLocal()
-    db_item = db.query(Category).filter(
+async def categoryCreate(new_category: CategoryRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Category).where(
         or_(
         Category.name == new_category.name,
-        Category.id == new_category.id)).first()
+        Category.id == new_category.id)).limit(1))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -22,45 +28,60 @@ async def categoryCreate(new_category: CategoryRequest):
     )
 
     db.add(category)
-    db.commit()
+    await db.commit()
 
     if category.created_at:
        return category
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@categories_router.post("/categories:bulk", response_model=BulkResult)
+async def categoryBulk(request: Request, format: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    text, format = await read_body(request, format)
+
+    return await import_records(db, "categories", text, format)
+
+@categories_router.get("/categories", response_model=Page[CategoryResponse])
+async def categoryList(cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    items, next_cursor = await paginate(db, select(Category), Category.created_at, Category.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
 @categories_router.get("/categories/{category_id}", response_model=CategoryResponse)
-async def categoryDetail(category_id: str):
-    db = SessionLocal()
-    db_item = db.query(Category).filter(Category.id==category_id).first()
-    if db_item is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+async def categoryDetail(category_id: str, request: Request):
+    cached = response_cache.get(("category", category_id))
+    if cached is None:
+        generation = response_cache.generation()
+        db_item = await flights.do(("category", category_id), fetch_row, Category, category_id)
+        if db_item is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        cached = cache_response(("category", category_id), CategoryResponse, db_item, generation)
 
-    return db_item
+    return conditional_response(request, cached)
 
 @categories_router.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def categoryDelete(category_id: str):
-    db = SessionLocal()
-    db_item = db.query(Category).filter(Category.id==category_id).first()
+async def categoryDelete(category_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Category).where(Category.id==category_id))
 
     if db_item is not None:
-        db.delete(db_item)
-        db.commit()
+        await invalidate_cached(db, category_cache_keys(db_item.id, db_item.name))
+        await db.delete(db_item)
+        await db.commit()
 
     return
 
 @categories_router.patch("/categories/{category_id}", response_model=CategoryResponse)
-async def categoryUpdate(category_id: str, category_patch : CategoryRequest):
-    db = SessionLocal()
-    db_item = db.query(Category).filter(Category.name==category_patch.name).first()
+async def categoryUpdate(category_id: str, category_patch : CategoryRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Category).where(Category.name==category_patch.name).limit(1))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
-    db_item = db.query(Category).filter(Category.id==category_id).first()
+    db_item = await db.scalar(select(Category).where(Category.id==category_id))
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
+    await invalidate_cached(db, category_cache_keys(db_item.id, db_item.name))
     db_item.name = category_patch.name
-    db.commit()
+    await db.commit()
 
     if db_item.created_at:
        return db_item
@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from ..models import User, Card, Publication, Category, Author, Instance, Rental, Reservation, publications_authors, publications_categories
+from ..database import SessionLocal
+
+export_router = APIRouter(tags=['export_router'])
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_TABLES = {
+    "users": User.__table__,
+    "cards": Card.__table__,
+    "publications": Publication.__table__,
+    "categories": Category.__table__,
+    "authors": Author.__table__,
+    "instances": Instance.__table__,
+    "rentals": Rental.__table__,
+    "reservations": Reservation.__table__,
+    "publications_authors": publications_authors,
+    "publications_categories": publications_categories,
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return value
+
+# SEARCH VECTORS ARE DERIVED INDEX DATA, NOT PART OF THE CATALOG
+def export_columns(table):
+    return [column for column in table.columns if not isinstance(column.type, TSVECTOR)]
+
+def export_statement(table, since: Optional[datetime]):
+    statement = select(*export_columns(table))
+    if "updated_at" not in table.c:
+        if since is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+        return statement.order_by(*table.primary_key.columns)
+
+    if since is not None:
+        statement = statement.where(table.c.updated_at > since)
+    return statement.order_by(table.c.updated_at, table.c.id)
+
+def ndjson_chunk(columns, rows):
+    return "".join(json.dumps({column: export_value(value) for column, value in zip(columns, row)}) + "\n" for row in rows)
+
+def csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([export_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+# THE SESSION LIVES AS LONG AS THE RESPONSE, ROWS COME FROM A SERVER SIDE CURSOR ONE PARTITION AT A TIME
+async def export_rows(statement, columns, format):
+    db = SessionLocal()
+    try:
+        result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if format == "csv":
+            yield csv_chunk([columns])
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            yield ndjson_chunk(columns, rows) if format == "ndjson" else csv_chunk(rows)
+        await result.close()
+    finally:
+        await db.close()
+
+@export_router.get("/export/{resource}")
+async def exportResource(resource: str, format: str = "ndjson", since: Optional[datetime] = None):
+    table = EXPORT_TABLES.get(resource)
+    if table is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    statement = export_statement(table, since)
+    columns = [column.name for column in export_columns(table)]
+
+    return StreamingResponse(export_rows(statement, columns, format), media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={resource}.{format}"})
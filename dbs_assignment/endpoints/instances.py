@@ -1,17 +1,25 @@
-from fastapi import status, HTTPException, APIRouter
-from ..models import Instance, Publication
-from ..schemas import InstanceRequest, InstanceResponse
-from ..database import SessionLocal
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Instance, Publication, instance_types, instance_statuses
+from ..schemas import InstanceRequest, InstanceResponse, Page, BulkResult
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights, fetch_row
+from ..bulk import import_records, read_body
+from ..availability import adjust_availability, instance_delta
+from ..cache import response_cache, invalidate_cached, cache_response, conditional_response
+from ..serializers import SerializingRoute
 
-instances_router = APIRouter(tags=['instances_router'])
+instances_router = APIRouter(tags=['instances_router'], route_class=SerializingRoute)
 
 @instances_router.post("/instances", response_model=InstanceResponse, status_code=status.HTTP_201_CREATED)
-async def instanceCreate(new_instance: InstanceRequest):
-    db = SessionLocal()
-    db_item = db.query(Publication).filter(Publication.id == new_instance.publication_id).first()
+async def instanceCreate(new_instance: InstanceRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Publication).where(Publication.id == new_instance.publication_id))
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-    db_item = db.query(Instance).filter(Instance.id == new_instance.id).first()
+    db_item = await db.scalar(select(Instance).where(Instance.id == new_instance.id))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -25,45 +33,75 @@ async def instanceCreate(new_instance: InstanceRequest):
     )
 
     db.add(instance)
-    db.commit()
+    await adjust_availability(db, [instance_delta(instance.id, instance.publication_id, instance.type, instance.status)])
+    await db.commit()
 
     if instance.created_at:
        return instance
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@instances_router.post("/instances:bulk", response_model=BulkResult)
+async def instanceBulk(request: Request, format: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    text, format = await read_body(request, format)
+
+    return await import_records(db, "instances", text, format)
+
+@instances_router.get("/instances", response_model=Page[InstanceResponse])
+async def instanceList(publication_id: Optional[str] = None, instance_type: Optional[str] = Query(None, alias="type"), instance_status: Optional[str] = Query(None, alias="status"), cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    statement = select(Instance)
+    if publication_id is not None:
+        statement = statement.where(Instance.publication_id == publication_id)
+    if instance_type is not None:
+        if instance_type not in instance_types:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+        statement = statement.where(Instance.type == instance_type)
+    if instance_status is not None:
+        if instance_status not in instance_statuses:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+        statement = statement.where(Instance.status == instance_status)
+    items, next_cursor = await paginate(db, statement, Instance.created_at, Instance.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
 @instances_router.get("/instances/{instance_id}", response_model=InstanceResponse)
-async def instanceDetail(instance_id: str):
-    db = SessionLocal()
-    db_item = db.query(Instance).filter(Instance.id==instance_id).first()
-    if db_item is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+async def instanceDetail(instance_id: str, request: Request):
+    cached = response_cache.get(("instance", instance_id))
+    if cached is None:
+        generation = response_cache.generation()
+        db_item = await flights.do(("instance", instance_id), fetch_row, Instance, instance_id)
+        if db_item is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        cached = cache_response(("instance", instance_id), InstanceResponse, db_item, generation)
 
-    return db_item
+    return conditional_response(request, cached)
 
 @instances_router.delete("/instances/{instance_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def instanceDelete(instance_id: str):
-    db = SessionLocal()
-    db_item = db.query(Instance).filter(Instance.id==instance_id).first()
+async def instanceDelete(instance_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Instance).where(Instance.id==instance_id).with_for_update())
 
     if db_item is not None:
-        db.delete(db_item)
-        db.commit()
+        await invalidate_cached(db, [("instance", instance_id)])
+        await adjust_availability(db, [instance_delta(db_item.id, db_item.publication_id, db_item.type, db_item.status, -1)])
+        await db.delete(db_item)
+        await db.commit()
 
     return
 
 @instances_router.patch("/instances/{instance_id}", response_model=InstanceResponse)
-async def instanceUpdate(instance_id: str, instance_patch : InstanceRequest):
-    db = SessionLocal()
-    instance = db.query(Instance).filter(Instance.id==instance_id).first()
+async def instanceUpdate(instance_id: str, instance_patch : InstanceRequest, db: AsyncSession = Depends(get_db)):
+    # LOCKED SO CONCURRENT PATCHES MOVE THE COUNTERS FROM THE STATE THE OTHER ONE LEFT
+    instance = await db.scalar(select(Instance).where(Instance.id==instance_id).with_for_update())
     if instance is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     if instance_patch.publication_id:
-        db_item = db.query(Publication).filter(Publication.id==instance_patch.publication_id).first()
+        db_item = await db.scalar(select(Publication).where(Publication.id==instance_patch.publication_id))
         if db_item is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
+    await invalidate_cached(db, [("instance", instance_id)])
+    before = instance_delta(instance.id, instance.publication_id, instance.type, instance.status, -1)
     if instance_patch.type:
         instance.type = instance_patch.type
     if instance_patch.publisher:
@@ -75,7 +113,8 @@ async def instanceUpdate(instance_id: str, instance_patch : InstanceRequest):
     if instance_patch.publication_id:
         instance.publication_id = instance_patch.publication_id
 
-    db.commit()
+    await adjust_availability(db, [before, instance_delta(instance.id, instance.publication_id, instance.type, instance.status)])
+    await db.commit()
 
     if instance.created_at:
        return instance
@@ -1,143 +1,159 @@
-from fastapi import status, HTTPException, APIRouter
-from sqlalchemy import or_
-from ..models import Publication, Author, Category
-from ..schemas import PublicationRequest, PublicationResponse
-from ..database import SessionLocal
-
-publications_router = APIRouter(tags=['publications_router'])
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, with_expression
+from ..models import Publication, instance_types
+from ..schemas import PublicationRequest, PublicationResponse, PublicationPage, AvailabilityResponse, QueueEntry, Page, BulkResult
+from ..database import get_db
+from ..pagination import paginate, encode_position_cursor, decode_position_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights
+from ..bulk import import_records, read_body
+from ..availability import publication_availability, availability_columns
+from ..queue import queue_page
+from ..facets import publication_filters, publication_facets
+from ..cache import response_cache, invalidate_cached, cache_response, conditional_response
+from ..references import author_keys, resolve_references, missing_references, link_publication
+from ..serializers import SerializingRoute
+
+publications_router = APIRouter(tags=['publications_router'], route_class=SerializingRoute)
+
+def publication_result(publication: Publication):
+    return {
+        "id" : publication.id,
+        "title" : publication.title,
+        "authors" : [{"name" : author.name, "surname" : author.surname} for author in publication.authors],
+        "categories" : [category.name for category in publication.categories],
+        "created_at" : publication.created_at,
+        "updated_at" : publication.updated_at
+    }
 
 @publications_router.post("/publications", status_code=status.HTTP_201_CREATED, response_model=PublicationResponse)
-async def publicationCreate(requested_publication: PublicationRequest):
-    db = SessionLocal()
-    db_item = db.query(Publication).filter(
-            Publication.id == requested_publication.id).first()
+async def publicationCreate(requested_publication: PublicationRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Publication.id).where(
+            Publication.id == requested_publication.id))
     if db_item:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
-    if requested_publication.authors:
-        existing_authors = db.query(Author).filter(or_(*(Author.name == author['name'] and Author.surname == author['surname'] for author in requested_publication.authors))).all()
-        if len(existing_authors) < len(requested_publication.authors):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-
-    if requested_publication.categories:
-        existing_categories = db.query(Category).filter(or_(*(Category.name == category for category in requested_publication.categories))).all()
-        if len(existing_categories) < len(requested_publication.categories):
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    author_ids, category_ids = await resolve_references(db, requested_publication.authors, requested_publication.categories)
+    if missing_references(requested_publication.authors, requested_publication.categories, author_ids, category_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
     new_publication = Publication(
         id=requested_publication.id,
-        title=requested_publication.title,
+        title=requested_publication.title
     )
 
     db.add(new_publication)
-    db.commit()
-
-    new_publication.authors = existing_authors
-    new_publication.categories = existing_categories
-
-    db.commit()
-
-    authors = []
-    if existing_authors:
-        for author in existing_authors:
-            authors.append({"name" : author.name, "surname" : author.surname})
-
-    categories = []
-    if existing_categories:
-        for category in existing_categories:
-            categories.append(category.name)
+    await db.flush()
+    await link_publication(db, new_publication.id, list(author_ids.values()), list(category_ids.values()))
+    await db.commit()
 
     result = {
         "id" : new_publication.id,
         "title" : new_publication.title,
-        "authors" : authors,
-        "categories" : categories,
+        "authors" : [{"name" : name, "surname" : surname} for name, surname in author_keys(requested_publication.authors)],
+        "categories" : list(dict.fromkeys(requested_publication.categories)),
         "created_at" : new_publication.created_at,
         "updated_at" : new_publication.updated_at
     }
 
     return result
 
-@publications_router.get("/publications/{publication_id}", response_model=PublicationResponse)
-async def publicationDetail(publication_id: str):
-    db = SessionLocal()
-    db_item = db.query(Publication).filter(Publication.id==publication_id).first()
-    if db_item is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+@publications_router.post("/publications:bulk", response_model=BulkResult)
+async def publicationBulk(request: Request, format: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    text, format = await read_body(request, format)
+
+    return await import_records(db, "publications", text, format)
 
-    authors = []
-    if db_item.authors:
-        for author in db_item.authors:
-            authors.append({"name" : author.name, "surname" : author.surname})
+# FACETS ARE ASKED FOR WITH facets=true AND ONLY COUNTED FOR THE FIRST PAGE, WITHOUT THEM EVERY PAGE COSTS THE SAME
+@publications_router.get("/publications", response_model=PublicationPage)
+async def publicationList(title: Optional[str] = None, category: Optional[str] = None, author: Optional[str] = None, instance_type: Optional[str] = Query(None, alias="type"), year_from: Optional[int] = None, year_to: Optional[int] = None, facets: bool = False, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    if instance_type is not None and instance_type not in instance_types:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
-    categories = []
-    if db_item.categories:
-        for category in db_item.categories:
-            categories.append(category.name)
+    filters, instance_conditions = publication_filters(title, category, author, instance_type, year_from, year_to)
 
-    result = {
-        "id" : db_item.id,
-        "title" : db_item.title,
-        "authors" : authors,
-        "categories" : categories,
-        "created_at" : db_item.created_at,
-        "updated_at" : db_item.updated_at
-    }
+    # BEFORE THE PAGE, THE FLIGHT TAKES A CONNECTION OF ITS OWN AND THIS REQUEST MUST NOT HOLD ONE WHILE IT WAITS FOR IT
+    counts = None
+    if facets and not cursor:
+        counts = await flights.do(("facets", title, category, author, instance_type, year_from, year_to), publication_facets, filters, instance_conditions)
+
+    total, available = availability_columns()
+    statement = select(Publication).where(*filters).options(
+        selectinload(Publication.authors), selectinload(Publication.categories),
+        with_expression(Publication.total_instances, total), with_expression(Publication.available_instances, available))
+    items, next_cursor = await paginate(db, statement, Publication.created_at, Publication.id, cursor, limit)
+
+    return {"items" : [{**publication_result(item), "total" : item.total_instances, "available" : item.available_instances} for item in items], "next_cursor" : next_cursor, "facets" : counts}
+
+async def publication_detail(db, publication_id: str):
+    db_item = await db.scalar(select(Publication).where(Publication.id==publication_id).options(
+        selectinload(Publication.authors), selectinload(Publication.categories)))
+    return publication_result(db_item) if db_item is not None else None
+
+@publications_router.get("/publications/{publication_id}", response_model=PublicationResponse)
+async def publicationDetail(publication_id: str, request: Request):
+    cached = response_cache.get(("publication", publication_id))
+    if cached is None:
+        generation = response_cache.generation()
+        result = await flights.do(("publication", publication_id), publication_detail, publication_id)
+        if result is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        cached = cache_response(("publication", publication_id), PublicationResponse, result, generation)
+
+    return conditional_response(request, cached)
+
+@publications_router.get("/publications/{publication_id}/availability", response_model=AvailabilityResponse)
+async def publicationAvailability(publication_id: str):
+    result = await flights.do(("availability", publication_id), publication_availability, publication_id)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     return result
 
+@publications_router.get("/publications/{publication_id}/queue", response_model=Page[QueueEntry])
+async def publicationQueue(publication_id: str, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Publication.id).where(Publication.id == publication_id))
+    if db_item is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    items, next_position = await queue_page(db, publication_id, decode_position_cursor(cursor) if cursor else None, limit)
+
+    return {"items" : items, "next_cursor" : encode_position_cursor(next_position) if next_position is not None else None}
 
 @publications_router.delete("/publications/{publication_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def publicationDelete(publication_id: str):
-    db = SessionLocal()
-    db_item = db.query(Publication).filter(Publication.id==publication_id).first()
+async def publicationDelete(publication_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Publication).where(Publication.id==publication_id))
 
+    # THE CASCADE ALSO DELETES ITS INSTANCES
     if db_item is not None:
-        db.delete(db_item)
-        db.commit()
+        await invalidate_cached(db, [("publication", publication_id), ("instance",)])
+        await db.delete(db_item)
+        await db.commit()
 
     return
 
 @publications_router.patch("/publications/{publication_id}", response_model=PublicationResponse)
-async def publicationUpdate(publication_id: str, publication_patch : PublicationRequest):
-    db = SessionLocal()
-    publication = db.query(Publication).filter(Publication.id==publication_id).first()
+async def publicationUpdate(publication_id: str, publication_patch : PublicationRequest, db: AsyncSession = Depends(get_db)):
+    publication = await db.scalar(select(Publication).where(Publication.id==publication_id))
     if publication is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
-    existing_authors = existing_categories = []
-
-    if publication_patch.authors:
-        existing_authors = db.query(Author).filter(or_(*(Author.name == author['name'] and Author.surname == author['surname'] for author in publication_patch.authors))).all()
-        if len(existing_authors) < len(publication_patch.authors):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-
-    if publication_patch.categories:
-        existing_categories = db.query(Category).filter(or_(*(Category.name == category for category in publication_patch.categories))).all()
-        if len(existing_categories) < len(publication_patch.categories):
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    author_ids, category_ids = await resolve_references(db, publication_patch.authors, publication_patch.categories)
+    if missing_references(publication_patch.authors, publication_patch.categories, author_ids, category_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
+    await invalidate_cached(db, [("publication", publication_id)])
     publication.title = publication_patch.title
-    publication.authors = existing_authors
-    publication.categories = existing_categories
-
-    authors = []
-    if publication_patch.authors:
-        for author in existing_authors:
-            authors.append({"name" : author.name, "surname" : author.surname})
-
-    categories = []
-    if publication_patch.categories:
-        for category in existing_categories:
-            categories.append(category.name)
-
-    db.commit()
+    await link_publication(db, publication_id, list(author_ids.values()), list(category_ids.values()), replace=True)
+    await db.commit()
 
     result = {
             "id" : publication_id,
             "title" : publication.title,
-            "authors" : authors,
-            "categories" : categories,
+            "authors" : [{"name" : name, "surname" : surname} for name, surname in author_keys(publication_patch.authors)],
+            "categories" : list(dict.fromkeys(publication_patch.categories)),
             "created_at" : publication.created_at,
             "updated_at" : publication.updated_at
         }
@@ -1,41 +1,50 @@
-from fastapi import status, HTTPException, APIRouter
-from ..models import Rental, User, Publication, Reservation
-from ..schemas import RentalRequest, RentalResponse, RentalPatch
-from ..database import SessionLocal
-
-rentals_router = APIRouter(tags=['rentals_router'])
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Rental, User, Publication, rental_statuses
+from ..schemas import RentalRequest, RentalResponse, RentalPatch, Page
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights, fetch_row
+from ..availability import claim_available_instance
+from ..queue import lock_queue, queue_head, dequeue
+from ..cache import invalidate_cached
+from ..serializers import SerializingRoute
+
+rentals_router = APIRouter(tags=['rentals_router'], route_class=SerializingRoute)
 
 @rentals_router.post("/rentals", response_model=RentalResponse, status_code=status.HTTP_201_CREATED)
-async def rentalCreate(new_rental: RentalRequest):
-    db = SessionLocal()
-    db_item = db.query(Rental).filter(Rental.id == new_rental.id).first()
+async def rentalCreate(new_rental: RentalRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Rental).where(Rental.id == new_rental.id))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
-    user = db.query(User).filter(User.id == new_rental.user_id).first()
+    user = await db.scalar(select(User).where(User.id == new_rental.user_id))
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    publication = db.query(Publication).filter(Publication.id == new_rental.publication_id).first()
+    publication = await db.scalar(select(Publication.id).where(Publication.id == new_rental.publication_id))
     if publication is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    available_instance = None
-    if publication.instances:
-        for instance in publication.instances:
-            if instance.status == "available":
-                available_instance = instance
-                break
+    # A CONCURRENT RENTAL OR CANCELLATION WAITS HERE, SO ONLY ONE CHECKOUT ACTS ON A HEAD AND NOBODY SKIPS ONE BEING DEQUEUED
+    await lock_queue(db, new_rental.publication_id)
+    reservation = await queue_head(db, new_rental.publication_id)
+
+    if reservation is not None:
+        if reservation.user_id != new_rental.user_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
+    # ROW STAYS LOCKED UNTIL THE RENTAL IS COMMITTED
+    available_instance = await claim_available_instance(db, new_rental.publication_id)
     if not available_instance:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    await invalidate_cached(db, [("instance", available_instance.id)])
 
-    reservation = db.query(Reservation).filter(Reservation.publication_id == new_rental.publication_id).order_by(
-        Reservation.created_at.asc()).first()
-
+    # THE NEXT WAITER BECOMES THE HEAD IN THE SAME TRANSACTION
     if reservation is not None:
-        if reservation.user_id != new_rental.user_id:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+        await dequeue(db, new_rental.publication_id, reservation.id)
 
     rental = Rental(
         id=new_rental.id,
@@ -44,34 +53,45 @@ async def rentalCreate(new_rental: RentalRequest):
         duration=new_rental.duration
     )
 
-    available_instance.status = "reserved"
-
     db.add(rental)
-    db.commit()
+    await db.commit()
 
     if rental.start_date:
        return rental
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@rentals_router.get("/rentals", response_model=Page[RentalResponse])
+async def rentalList(user_id: Optional[str] = None, publication_instance_id: Optional[str] = None, rental_status: Optional[str] = Query(None, alias="status"), cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    statement = select(Rental)
+    if user_id is not None:
+        statement = statement.where(Rental.user_id == user_id)
+    if publication_instance_id is not None:
+        statement = statement.where(Rental.publication_instance_id == publication_instance_id)
+    if rental_status is not None:
+        if rental_status not in rental_statuses:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+        statement = statement.where(Rental.status == rental_status)
+    items, next_cursor = await paginate(db, statement, Rental.start_date, Rental.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
 @rentals_router.get("/rentals/{rental_id}", response_model=RentalResponse)
 async def rentalDetail(rental_id: str):
-    db = SessionLocal()
-    db_item = db.query(Rental).filter(Rental.id==rental_id).first()
+    db_item = await flights.do(("rental", rental_id), fetch_row, Rental, rental_id)
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     return db_item
 
 @rentals_router.patch("/rentals/{rental_id}", response_model=RentalResponse)
-async def rentalUpdate(rental_id: str, rental_patch : RentalPatch):
-    db = SessionLocal()
-    rental = db.query(Rental).filter(Rental.id==rental_id).first()
+async def rentalUpdate(rental_id: str, rental_patch : RentalPatch, db: AsyncSession = Depends(get_db)):
+    rental = await db.scalar(select(Rental).where(Rental.id==rental_id))
     if rental is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
     rental.duration = rental_patch.duration
-    db.commit()
+    await db.commit()
 
     if rental.start_date:
        return rental
@@ -1,64 +1,83 @@
-from fastapi import status, HTTPException, APIRouter
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import Reservation, User, Publication
-from ..schemas import ReservationRequest, ReservationResponse
-from ..database import SessionLocal
+from ..schemas import ReservationRequest, ReservationResponse, QueuePosition, Page
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights, fetch_row
+from ..availability import has_available_instance
+from ..queue import enqueue, dequeue, queue_position
+from ..serializers import SerializingRoute
 
-reservations_router = APIRouter(tags=['reservations_router'])
+reservations_router = APIRouter(tags=['reservations_router'], route_class=SerializingRoute)
 
 @reservations_router.post("/reservations", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED)
-async def reservationCreate(new_reservation: ReservationRequest):
-    db = SessionLocal()
-    db_item = db.query(Reservation).filter(Reservation.id == new_reservation.id).first()
+async def reservationCreate(new_reservation: ReservationRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Reservation).where(Reservation.id == new_reservation.id))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
-    db_item = db.query(User).filter(User.id == new_reservation.user_id).first()
+    db_item = await db.scalar(select(User).where(User.id == new_reservation.user_id))
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
-    publication = db.query(Publication).filter(Publication.id == new_reservation.publication_id).first()
+    publication = await db.scalar(select(Publication.id).where(Publication.id == new_reservation.publication_id))
     if publication is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
-    available = False
-    if publication.instances:
-        for instance in publication.instances:
-            if instance.status == "available":
-                available = True
-
-    if available:
+    if await has_available_instance(db, new_reservation.publication_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
     reservation = Reservation(
         id=new_reservation.id,
         user_id=new_reservation.user_id,
         publication_id=new_reservation.publication_id,
+        queue_position=await enqueue(db, new_reservation.publication_id),
     )
 
     db.add(reservation)
-    db.commit()
+    await db.commit()
 
     if reservation.created_at:
        return reservation
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@reservations_router.get("/reservations", response_model=Page[ReservationResponse])
+async def reservationList(user_id: Optional[str] = None, publication_id: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    statement = select(Reservation)
+    if user_id is not None:
+        statement = statement.where(Reservation.user_id == user_id)
+    if publication_id is not None:
+        statement = statement.where(Reservation.publication_id == publication_id)
+    items, next_cursor = await paginate(db, statement, Reservation.created_at, Reservation.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
 @reservations_router.get("/reservations/{reservation_id}", response_model=ReservationResponse)
 async def reservationDetail(reservation_id: str):
-    db = SessionLocal()
-    db_item = db.query(Reservation).filter(Reservation.id==reservation_id).first()
+    db_item = await flights.do(("reservation", reservation_id), fetch_row, Reservation, reservation_id)
     if db_item is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     return db_item
 
+@reservations_router.get("/reservations/{reservation_id}/position", response_model=QueuePosition)
+async def reservationPosition(reservation_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Reservation).where(Reservation.id==reservation_id))
+    if db_item is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await queue_position(db, db_item)
+
 @reservations_router.delete("/reservations/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def reservationDelete(reservation_id: str):
-    db = SessionLocal()
-    db_item = db.query(Reservation).filter(Reservation.id==reservation_id).first()
+async def reservationDelete(reservation_id: str, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(Reservation).where(Reservation.id==reservation_id))
 
     if db_item is not None:
-        db.delete(db_item)
-        db.commit()
+        await dequeue(db, db_item.publication_id, db_item.id)
+        await db.commit()
 
     return
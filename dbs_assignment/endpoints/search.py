@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import instance_types
+from ..schemas import SearchPage
+from ..database import get_db
+from ..pagination import encode_score_cursor, decode_score_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..search import prefix_query, has_trigram, prepare_search, scored_publications, search_page, search_facets
+from ..serializers import SerializingRoute
+
+search_router = APIRouter(tags=['search_router'], route_class=SerializingRoute)
+
+# FACETS DESCRIBE THE WHOLE RESULT SET SO THEY ARE ONLY COUNTED FOR THE FIRST PAGE
+@search_router.get("/search", response_model=SearchPage)
+async def search(q: str = Query(..., min_length=1, max_length=200), available: Optional[bool] = None, instance_type: Optional[str] = Query(None, alias="type"), cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    tsquery = prefix_query(q)
+    if tsquery is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    if instance_type is not None and instance_type not in instance_types:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    await prepare_search(db)
+    scored = scored_publications(q, tsquery, await has_trigram(db), available, instance_type)
+    items, next_key = await search_page(db, scored, decode_score_cursor(cursor) if cursor else None, limit)
+    facets = await search_facets(db, scored) if cursor is None else None
+
+    return {"items" : items, "next_cursor" : encode_score_cursor(*next_key) if next_key is not None else None, "facets" : facets}
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from ..database import pool_status
+from ..cache import cache_stats
+from ..singleflight import flights
+from ..sweeper import sweeper_stats
+from ..instrumentation import route_stats
+from ..metrics import render_metrics, CONTENT_TYPE
+
+stats_router = APIRouter(tags=['stats_router'])
+
+@stats_router.get("/stats/pool")
+async def poolStats():
+    return pool_status()
+
+@stats_router.get("/stats/cache")
+async def cacheStats():
+    return cache_stats()
+
+@stats_router.get("/stats/singleflight")
+async def singleflightStats():
+    return flights.stats()
+
+@stats_router.get("/stats/sweeper")
+async def sweeperStats():
+    return sweeper_stats()
+
+@stats_router.get("/stats/routes")
+async def routeStats():
+    return route_stats()
+
+@stats_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
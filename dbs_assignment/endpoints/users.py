@@ -1,19 +1,28 @@
-from fastapi import status, HTTPException, APIRouter
+from typing import Optional
+from fastapi import status, HTTPException, APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from ..models import User
-from ..schemas import UserRequest, UserResponse, UserPatch
-from ..database import SessionLocal
-from datetime import timezone
+from ..schemas import UserRequest, UserResponse, UserPatch, Page
+from ..database import get_db
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..singleflight import flights
+from ..serializers import SerializingRoute
+from datetime import datetime, timezone
 
-users_router = APIRouter(tags=['users_router'])
+users_router = APIRouter(tags=['users_router'], route_class=SerializingRoute)
 
-@users_router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def userCreate(new_user: UserRequest):
-    db = SessionLocal()
+# ASYNCPG DOES NOT CAST STRINGS, BIRTH DATE HAS TO BE BOUND AS A DATETIME
+def to_birth_date(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
 
-    db_item = db.query(User).filter(User.id == new_user.id).first()
+@users_router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def userCreate(new_user: UserRequest, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(User).where(User.id == new_user.id))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
-    db_item = db.query(User).filter(User.email == new_user.email).first()
+    db_item = await db.scalar(select(User).where(User.email == new_user.email))
     if db_item is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -22,24 +31,33 @@ async def userCreate(new_user: UserRequest):
         name=new_user.name,
         surname=new_user.surname,
         email=new_user.email,
-        birth_date=new_user.birth_date,
+        birth_date=to_birth_date(new_user.birth_date),
         personal_identificator=new_user.personal_identificator
     )
 
     db.add(new_user)
-    db.commit()
+    await db.commit()
 
     if new_user.created_at:
        return new_user
     else:
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@users_router.get("/users/{user_id}")
-async def userDetail(user_id: str):
-    db = SessionLocal()
-    db_item = db.query(User).filter(User.id==user_id).first()
+@users_router.get("/users", response_model=Page[UserResponse])
+async def userList(email: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db)):
+    statement = select(User)
+    if email is not None:
+        statement = statement.where(User.email == email)
+    items, next_cursor = await paginate(db, statement, User.created_at, User.id, cursor, limit)
+
+    return {"items" : items, "next_cursor" : next_cursor}
+
+# THE WHOLE RESPONSE IS BUILT INSIDE THE FLIGHT, NO ORM OBJECT OUTLIVES ITS SESSION
+async def user_detail(db, user_id: str):
+    db_item = await db.scalar(select(User).where(User.id==user_id).options(
+        selectinload(User.rentals), selectinload(User.reservations)))
     if db_item is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return None
 
     birth = db_item.birth_date.astimezone(timezone.utc).strftime('%Y-%m-%d')
 
@@ -80,14 +98,21 @@ async def userDetail(user_id: str):
 
     return result
 
+@users_router.get("/users/{user_id}")
+async def userDetail(user_id: str):
+    result = await flights.do(("user", user_id), user_detail, user_id)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return result
+
 @users_router.patch("/users/{user_id}")
-async def userUpdate(user_id: str, user_patch : UserPatch):
-    db = SessionLocal()
-    user = db.query(User).filter(User.id == user_id).first()
+async def userUpdate(user_id: str, user_patch : UserPatch, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.id == user_id))
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    db_item = db.query(User).filter(User.email==user_patch.email).first()
+    db_item = await db.scalar(select(User).where(User.email==user_patch.email))
     if db_item is not None and user_id != db_item.id:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT)
 
@@ -98,11 +123,11 @@ async def userUpdate(user_id: str, user_patch : UserPatch):
     if user_patch.email:
         user.email = user_patch.email
     if user_patch.birth_date:
-        user.birth_date = user_patch.birth_date
+        user.birth_date = to_birth_date(user_patch.birth_date)
     if user_patch.personal_identificator:
         user.personal_identificator = user_patch.personal_identificator
 
-    db.commit()
+    await db.commit()
 
     birth = user.birth_date.astimezone(timezone.utc).strftime('%Y-%m-%d')
 
@@ -0,0 +1,109 @@
+from sqlalchemy import select, func, literal, null, union_all, case, cast, and_, or_, exists, true, Float, Integer, String
+from .configuration import conf
+from .models import Publication, Author, Category, Instance, publications_authors, publications_categories, availability_counts, instance_types
+
+# VALUES LISTED PER CATEGORY AND AUTHOR FACET, THE MOST FREQUENT FIRST, TYPES AND YEARS ARE ALWAYS LISTED IN FULL
+FACET_SIZE = 20
+
+# EVERY ID OF ids WHOSE HASH FALLS INTO ONE OF ceil(results / limit) BUCKETS, ABOUT limit ROWS NO MATTER HOW MANY MATCHED
+# THE HASH KEEPS THE SAMPLE THE SAME FOR THE SAME RESULTS, results IS THE EXACT COUNT OF ids ON EVERY ROW
+def hash_sample(ids, column, limit: int):
+    matched = select(func.count().label("results")).select_from(ids).cte("matched")
+    step = func.greatest(1, cast(func.ceil(cast(matched.c.results, Float) / limit), Integer))
+    return (select(column.label("publication_id"), matched.c.results)
+        .select_from(ids).join(matched, true())
+        .where(func.hashtext(column).op("&")(0x7fffffff) % step == 0)).cte("sample")
+
+# WHERE CLAUSES ON Publication AND THE CONDITIONS ON instances THEY IMPLY
+# A CATEGORY OR AUTHOR IS A SEMI JOIN THROUGH ITS LINK TABLE INDEX, A TYPE ALONE IS ANSWERED BY THE COUNTERS
+def publication_filters(title: str = None, category: str = None, author: str = None, instance_type: str = None, year_from: int = None, year_to: int = None):
+    filters = []
+    if title is not None:
+        filters.append(Publication.title == title)
+    if category is not None:
+        filters.append(Publication.id.in_(select(publications_categories.c.publication_id)
+            .join(Category, Category.id == publications_categories.c.category_id).where(Category.name == category)))
+    if author is not None:
+        filters.append(Publication.id.in_(select(publications_authors.c.publication_id).where(publications_authors.c.author_id == author)))
+
+    instance_conditions = []
+    if instance_type is not None:
+        instance_conditions.append(Instance.type == instance_type)
+    if year_from is not None:
+        instance_conditions.append(Instance.year >= year_from)
+    if year_to is not None:
+        instance_conditions.append(Instance.year <= year_to)
+
+    if year_from is not None or year_to is not None:
+        filters.append(exists().where(Instance.publication_id == Publication.id, *instance_conditions))
+    elif instance_type is not None:
+        filters.append(exists().where(availability_counts.c.publication_id == Publication.id,
+            availability_counts.c.type == instance_type, availability_counts.c.total > 0))
+    return filters, instance_conditions
+
+# PUBLICATIONS PER CATEGORY, AUTHOR, INSTANCE TYPE AND INSTANCE YEAR OF THE FILTERED SET IN ONE STATEMENT
+# TYPES AND YEARS ARE ONE PASS OVER instances WITH GROUPING SETS, THE TOP CATEGORIES AND AUTHORS ARE RANKED BY
+# A WINDOW BEFORE THEIR IDS ARE JOINED TO NAMES, PAST PUBLICATION_FACET_LIMIT RESULTS IT ALL COUNTS A HASH SAMPLE SCALED UP,
+# THE SAME WAY AS THE SEARCH FACETS
+async def publication_facets(db, filters: list, instance_conditions: list):
+    limit = conf.PUBLICATION_FACET_LIMIT
+    filtered = select(Publication.id).where(*filters).cte("filtered")
+    # A FILTERED SET IS MATERIALIZED ONCE, INLINED THE PLANNER TESTS THE HASH BEFORE THE FILTER AND PROBES MOST OF THE
+    # CATALOG, THE WHOLE CATALOG IS CHEAPER TO SCAN TWICE THAN TO COPY
+    if not filters:
+        filtered = filtered.prefix_with("NOT MATERIALIZED")
+    sample = hash_sample(filtered, filtered.c.id, limit)
+
+    # LATERAL, SO EVERY SAMPLED PUBLICATION PROBES THE INDEXES ON publication_id, THE PLANNER OTHERWISE HASHES THE
+    # WHOLE LINK TABLES FOR A FEW THOUSAND IDS, OFFSET 0 KEEPS IT FROM FLATTENING THEM BACK INTO PLAIN JOINS
+    categories = (select(publications_categories.c.category_id)
+        .where(publications_categories.c.publication_id == sample.c.publication_id).offset(0).lateral("categories"))
+    authors = (select(publications_authors.c.author_id)
+        .where(publications_authors.c.publication_id == sample.c.publication_id).offset(0).lateral("authors"))
+    instances = (select(Instance.type, Instance.year)
+        .where(Instance.publication_id == sample.c.publication_id, *instance_conditions).offset(0).lateral("instances"))
+
+    by_instance = func.grouping(instances.c.type) == 0
+    facets = union_all(
+        select(literal("results").label("facet"), null().label("key"), func.count().label("count"), func.max(sample.c.results).label("results"))
+            .select_from(sample),
+        select(literal("category"), categories.c.category_id, func.count(), null())
+            .select_from(sample).join(categories, true())
+            .group_by(categories.c.category_id),
+        select(literal("author"), authors.c.author_id, func.count(), null())
+            .select_from(sample).join(authors, true())
+            .group_by(authors.c.author_id),
+        select(case((by_instance, literal("type")), else_=literal("year")),
+                case((by_instance, cast(instances.c.type, String)), else_=cast(instances.c.year, String)),
+                func.count(sample.c.publication_id.distinct()), null())
+            .select_from(sample).join(instances, true())
+            .group_by(func.grouping_sets(instances.c.type, instances.c.year)),
+    ).subquery("facets")
+
+    rank = func.row_number().over(partition_by=facets.c.facet, order_by=(facets.c.count.desc(), facets.c.key))
+    ranked = select(facets, rank.label("rank")).subquery("ranked")
+    rows = (await db.execute(select(ranked.c.facet, ranked.c.key, ranked.c.count, ranked.c.results, Category.name, Author.name, Author.surname)
+        .outerjoin(Category, and_(ranked.c.facet == "category", Category.id == ranked.c.key))
+        .outerjoin(Author, and_(ranked.c.facet == "author", Author.id == ranked.c.key))
+        .where(or_(ranked.c.rank <= FACET_SIZE, ranked.c.facet.in_(["results", "type", "year"])))
+        .order_by(ranked.c.facet, ranked.c.rank))).all()
+
+    overall = next((row for row in rows if row.facet == "results"), None)
+    results = (overall.results if overall is not None else None) or 0
+    sampled = overall.count if overall is not None else 0
+    scale = results / sampled if sampled else 1.0
+
+    # CATEGORY NAMES ARE NOT UNIQUE, EVERY CATEGORY IS ITS OWN ENTRY UNDER ITS id LIKE THE AUTHORS
+    counts = {"results": results, "categories": [], "authors": [], "types": {instance_type: 0 for instance_type in instance_types}, "years": {}, "estimated": results > limit}
+    for facet, key, count, _, category_name, author_name, author_surname in rows:
+        count = round(count * scale)
+        if facet == "category":
+            counts["categories"].append({"id": key, "name": category_name, "count": count})
+        elif facet == "author":
+            counts["authors"].append({"id": key, "name": author_name, "surname": author_surname, "count": count})
+        elif facet == "type":
+            counts["types"][key] = count
+        elif facet == "year":
+            counts["years"][key] = count
+    counts["years"] = dict(sorted(counts["years"].items()))
+    return counts
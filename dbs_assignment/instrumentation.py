@@ -0,0 +1,145 @@
+import bisect
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from .configuration import conf
+
+logger = logging.getLogger(__name__)
+
+# MUTABLE HOLDER, THE THREADPOOL AND THE ASYNCIO GREENLET ONLY SEE A COPY OF THE CONTEXT
+class QueryStats:
+    __slots__ = ("count", "db_time", "rows")
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+# UPPER BOUNDS IN SECONDS OF THE LATENCY HISTOGRAM BUCKETS, THE LAST BUCKET OF EVERY ROUTE IS +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# TOTALS OF ONE ROUTE SINCE THE WORKER STARTED, ONLY THE EVENT LOOP THREAD WRITES THEM SO THEY NEED NO LOCK
+class RouteStats:
+    __slots__ = ("requests", "errors", "queries", "db_time", "rows", "time", "max_time", "statuses", "latency")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.time = 0.0
+        self.max_time = 0.0
+        self.statuses = {}
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+
+request_stats: ContextVar = ContextVar("request_stats", default=None)
+request_scope: ContextVar = ContextVar("request_scope", default=None)
+routes = {}
+route_names = {}
+in_flight = 0
+
+# KEYS AND TYPES OF THE BOUND PARAMETERS, NEVER THEIR VALUES
+def parameter_shape(parameters, executemany: bool):
+    if executemany:
+        return f"{len(parameters)} x {parameter_shape(parameters[0], False)}" if parameters else "[]"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters or ()) + ")"
+
+# THE START TIME LIVES ON THE EXECUTION CONTEXT OF THE STATEMENT, A STATEMENT THAT FAILS NEVER REACHES after_execute AND
+# ITS CONTEXT IS DROPPED WITH IT INSTEAD OF LEAVING A STALE TIME ON THE POOLED CONNECTION
+# STATEMENTS SQLALCHEMY RUNS ON ITS OWN, LIKE A DEFAULT FROM A SEQUENCE, HAVE NO CONTEXT AND ARE NOT MEASURED
+def before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+def after_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    elapsed = time.perf_counter() - context.query_started
+    stats = request_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.db_time += elapsed
+        stats.rows += max(cursor.rowcount, 0)
+    if conf.SLOW_QUERY_MS and elapsed * 1000 >= conf.SLOW_QUERY_MS:
+        scope = request_scope.get()
+        logger.warning("slow query %.1fms in %s: %s %s", elapsed * 1000, route_name(scope) if scope is not None else "-",
+                       " ".join(statement.split()), parameter_shape(parameters, executemany))
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", before_execute)
+    event.listen(engine, "after_cursor_execute", after_execute)
+
+# "METHOD /path/{param}" OF THE MATCHED ROUTE, LOOKED UP ONCE PER ENDPOINT
+def route_name(scope: dict):
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return f"{scope['method']} {scope['path']}"
+    name = route_names.get((scope["method"], endpoint))
+    if name is None:
+        path = next((route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint), endpoint.__name__)
+        name = route_names[(scope["method"], endpoint)] = f"{scope['method']} {path}"
+    return name
+
+def route_stats():
+    return {name: {"requests": route.requests, "errors": route.errors, "queries": route.queries, "rows": route.rows,
+                   "db_time_ms": round(route.db_time * 1000, 1), "time_ms": round(route.time * 1000, 1),
+                   "max_time_ms": round(route.max_time * 1000, 1)}
+            for name, route in sorted(routes.items(), key=lambda item: item[1].db_time, reverse=True)}
+
+# PLAIN ASGI MIDDLEWARE, ADDS THE REQUEST TO ITS ROUTE'S TOTALS AND WITH headers X-Query-Count AND Server-Timing TO EVERY
+# RESPONSE, THE QUERY COUNTS STAY 0 UNLESS THE ENGINES ARE INSTRUMENTED
+class QueryCountMiddleware:
+    def __init__(self, app, headers: bool = True):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        in_flight += 1
+        stats = QueryStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            if message["type"] == "http.response.start" and self.headers:
+                timing = f'db;dur={stats.db_time * 1000:.1f};desc="{stats.count} queries, {stats.rows} rows", app;dur={(time.perf_counter() - started) * 1000:.1f}'
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-count", str(stats.count).encode()), (b"server-timing", timing.encode())]
+            await send(message)
+
+        # THE ROUTER ADDS THE MATCHED ENDPOINT TO THIS SCOPE, THE ROUTE IS LOOKED UP FROM IT ONLY WHEN NEEDED
+        scope_token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight -= 1
+            request_stats.reset(token)
+            request_scope.reset(scope_token)
+
+            # REQUESTS NO ROUTE MATCHED SHARE ONE ENTRY, NOT ONE PER PATH
+            name = route_name(scope) if "endpoint" in scope else "unmatched"
+            route = routes.get(name)
+            if route is None:
+                route = routes[name] = RouteStats()
+            route.requests += 1
+            route.errors += status >= 500
+            route.queries += stats.count
+            route.db_time += stats.db_time
+            route.rows += stats.rows
+            route.time += elapsed
+            route.max_time = max(route.max_time, elapsed)
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+            route.latency[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
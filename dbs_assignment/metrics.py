@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import os
+from . import instrumentation
+from .instrumentation import LATENCY_BUCKETS
+from .configuration import conf
+from .database import pool_status
+from .cache import reference_cache, response_cache, invalidation_listener
+from .singleflight import flights
+from .sweeper import last_sweep
+
+logger = logging.getLogger(__name__)
+
+# PROMETHEUS TEXT FORMAT 0.0.4, WITH METRICS_DIR SET EVERY WORKER WRITES ITS SAMPLES TO <pid>.json THERE AND A SCRAPE OF ANY
+# WORKER ADDS UP ALL OF THEM: COUNTERS AND HISTOGRAMS OF EVERY FILE, ALSO OF WORKERS THAT HAVE EXITED SO TOTALS NEVER GO
+# BACK, AND GAUGES ONLY OF WORKERS STILL RUNNING
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def sample(name: str, value, **labels) -> tuple:
+    return name, tuple((key, str(label)) for key, label in labels.items()), value
+
+class Exposition:
+    def __init__(self):
+        self.families = {}
+
+    def metric(self, name: str, kind: str, help: str, samples: list):
+        self.families[name] = (kind, help, {(sample_name, labels): value for sample_name, labels, value in samples})
+
+    # ADDS THE SAMPLES OF ANOTHER WORKER, GAUGES ONLY WHEN live
+    def merge(self, families: dict, live: bool):
+        for name, (kind, help, samples) in families.items():
+            if kind == "gauge" and not live:
+                continue
+            merged = self.families.setdefault(name, (kind, help, {}))[2]
+            for key, value in samples.items():
+                merged[key] = merged.get(key, 0) + value
+
+    def dump(self) -> str:
+        return json.dumps({name: [kind, help, [[sample_name, labels, value] for (sample_name, labels), value in samples.items()]]
+                           for name, (kind, help, samples) in self.families.items()})
+
+    @staticmethod
+    def load(text: str) -> dict:
+        return {name: (kind, help, {(sample_name, tuple(map(tuple, labels))): value for sample_name, labels, value in samples})
+                for name, (kind, help, samples) in json.loads(text).items()}
+
+    def text(self) -> str:
+        lines = []
+        for name, (kind, help, samples) in self.families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (sample_name, labels), value in samples.items():
+                if labels:
+                    sample_name += "{" + ",".join(f'{key}="{escape(label)}"' for key, label in labels) + "}"
+                lines.append(f"{sample_name} {round(value, 6) if isinstance(value, float) else value}")
+        return "\n".join(lines) + "\n"
+
+def route_metrics(exposition: Exposition):
+    routes = list(instrumentation.routes.items())
+
+    latency = []
+    for route, stats in routes:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.latency):
+            cumulative += count
+            latency.append(sample("dbs_http_request_duration_seconds_bucket", cumulative, route=route, le=bound))
+        latency.append(sample("dbs_http_request_duration_seconds_sum", stats.time, route=route))
+        latency.append(sample("dbs_http_request_duration_seconds_count", stats.requests, route=route))
+
+    exposition.metric("dbs_http_requests_in_flight", "gauge", "Requests being served",
+        [sample("dbs_http_requests_in_flight", instrumentation.in_flight)])
+    exposition.metric("dbs_http_requests_total", "counter", "Responses by route and status code",
+        [sample("dbs_http_requests_total", count, route=route, status=status)
+         for route, stats in routes for status, count in sorted(stats.statuses.items())])
+    exposition.metric("dbs_http_request_duration_seconds", "histogram", "Time to serve a request by route", latency)
+    exposition.metric("dbs_db_queries_total", "counter", "SQL statements by route",
+        [sample("dbs_db_queries_total", stats.queries, route=route) for route, stats in routes])
+    exposition.metric("dbs_db_rows_total", "counter", "Rows returned or changed by route",
+        [sample("dbs_db_rows_total", stats.rows, route=route) for route, stats in routes])
+    exposition.metric("dbs_db_seconds_total", "counter", "Time spent in SQL statements by route",
+        [sample("dbs_db_seconds_total", stats.db_time, route=route) for route, stats in routes])
+
+def pool_metrics(exposition: Exposition):
+    for key, value in pool_status().items():
+        exposition.metric(f"dbs_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}", [sample(f"dbs_pool_{key}", value)])
+
+def cache_metrics(exposition: Exposition):
+    caches = {"references": reference_cache.stats(), "responses": response_cache.stats()}
+    for key, kind, help in [("hits", "counter", "Cache hits"), ("misses", "counter", "Cache misses"),
+                            ("evictions", "counter", "Entries evicted for space"), ("expirations", "counter", "Entries expired"),
+                            ("invalidations", "counter", "Entries invalidated"),
+                            ("stale_fills", "counter", "Fills not stored because their entry was invalidated while they read it"),
+                            ("size", "gauge", "Entries in the cache")]:
+        name = f"dbs_cache_{key}" + ("_total" if kind == "counter" else "")
+        exposition.metric(name, kind, help, [sample(name, stats[key], cache=cache) for cache, stats in caches.items()])
+    exposition.metric("dbs_cache_listening", "gauge", "Workers whose invalidation listener is connected",
+        [sample("dbs_cache_listening", int(invalidation_listener.connected))])
+
+# A RATIO DOES NOT ADD UP ACROSS WORKERS, IT IS TAKEN FROM THE SUMMED HITS AND MISSES
+def cache_ratio_metrics(exposition: Exposition):
+    hits = exposition.families["dbs_cache_hits_total"][2]
+    misses = exposition.families["dbs_cache_misses_total"][2]
+    ratios = []
+    for (_, labels), hit in hits.items():
+        lookups = hit + misses.get(("dbs_cache_misses_total", labels), 0)
+        ratios.append(sample("dbs_cache_hit_ratio", round(hit / lookups, 4) if lookups else 0, **dict(labels)))
+    exposition.metric("dbs_cache_hit_ratio", "gauge", "Hits out of all lookups", ratios)
+
+def background_metrics(exposition: Exposition):
+    stats = flights.stats()
+    exposition.metric("dbs_singleflight_in_flight", "gauge", "Distinct reads being executed", [sample("dbs_singleflight_in_flight", stats["in_flight"])])
+    exposition.metric("dbs_singleflight_executed_total", "counter", "Reads executed by kind",
+        [sample("dbs_singleflight_executed_total", kind_stats["executed"], kind=kind) for kind, kind_stats in stats["by_kind"].items()])
+    exposition.metric("dbs_singleflight_coalesced_total", "counter", "Reads served by another request's execution by kind",
+        [sample("dbs_singleflight_coalesced_total", kind_stats["coalesced"], kind=kind) for kind, kind_stats in stats["by_kind"].items()])
+    exposition.metric("dbs_sweeper_runs_total", "counter", "Overdue sweeps run", [sample("dbs_sweeper_runs_total", last_sweep["runs"])])
+    exposition.metric("dbs_sweeper_skipped_total", "counter", "Overdue sweeps skipped while another worker held the lock",
+        [sample("dbs_sweeper_skipped_total", last_sweep["skipped"])])
+    exposition.metric("dbs_sweeper_updated_total", "counter", "Rentals marked overdue", [sample("dbs_sweeper_updated_total", last_sweep["updated"])])
+
+def collect_metrics() -> Exposition:
+    exposition = Exposition()
+    route_metrics(exposition)
+    pool_metrics(exposition)
+    cache_metrics(exposition)
+    background_metrics(exposition)
+    return exposition
+
+def worker_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# WRITTEN WHOLE TO A TEMPORARY FILE AND RENAMED, A SCRAPE NEVER READS HALF OF IT
+def write_snapshot():
+    path = os.path.join(conf.METRICS_DIR, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as file:
+        file.write(collect_metrics().dump())
+    os.replace(path + ".tmp", path)
+
+async def run_snapshots(interval: float):
+    try:
+        while True:
+            try:
+                write_snapshot()
+            except OSError as exc:
+                logger.warning("metrics snapshot failed: %s", exc)
+            await asyncio.sleep(interval)
+    finally:
+        # THE LAST COUNTS OF A STOPPING WORKER STAY IN THE TOTALS
+        try:
+            write_snapshot()
+        except OSError as exc:
+            logger.warning("metrics snapshot failed: %s", exc)
+
+# THIS WORKER'S OWN SAMPLES ARE CURRENT, THE OTHERS' ARE AT MOST METRICS_SNAPSHOT_INTERVAL OLD
+def render_metrics() -> str:
+    exposition = collect_metrics()
+    if conf.METRICS_DIR:
+        for entry in os.scandir(conf.METRICS_DIR):
+            name, extension = os.path.splitext(entry.name)
+            if extension != ".json" or not name.isdigit() or int(name) == os.getpid():
+                continue
+            try:
+                with open(entry.path) as file:
+                    families = Exposition.load(file.read())
+            except (OSError, ValueError):
+                continue
+            exposition.merge(families, worker_alive(int(name)))
+    cache_ratio_metrics(exposition)
+    return exposition.text()
@@ -0,0 +1,101 @@
+-- BASELINE SCHEMA, IDENTICAL TO WHAT Base.metadata.create_all USED TO PRODUCE
+-- IF NOT EXISTS EVERYWHERE SO DATABASES CREATED THAT WAY ARE ADOPTED AS THEY ARE
+
+DO $$ BEGIN
+    CREATE TYPE card_status AS ENUM ('active', 'expired', 'inactive');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    CREATE TYPE instance_type AS ENUM ('physical', 'ebook', 'audiobook');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    CREATE TYPE instance_status AS ENUM ('available', 'reserved');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    CREATE TYPE rental_status AS ENUM ('active', 'returned', 'overdue');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE TABLE IF NOT EXISTS users (
+    name VARCHAR NOT NULL,
+    surname VARCHAR NOT NULL,
+    email VARCHAR NOT NULL UNIQUE,
+    birth_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    personal_identificator VARCHAR NOT NULL,
+    id VARCHAR NOT NULL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+    user_id VARCHAR NOT NULL REFERENCES users (id),
+    magstripe VARCHAR(20) NOT NULL,
+    status card_status NOT NULL,
+    id VARCHAR NOT NULL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS publications (
+    title VARCHAR NOT NULL,
+    id VARCHAR NOT NULL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS categories (
+    name VARCHAR NOT NULL,
+    id VARCHAR NOT NULL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS authors (
+    name VARCHAR NOT NULL,
+    surname VARCHAR NOT NULL,
+    id VARCHAR NOT NULL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS publications_authors (
+    publication_id VARCHAR REFERENCES publications (id),
+    author_id VARCHAR REFERENCES authors (id)
+);
+
+CREATE TABLE IF NOT EXISTS publications_categories (
+    publication_id VARCHAR REFERENCES publications (id),
+    category_id VARCHAR REFERENCES categories (id)
+);
+
+CREATE TABLE IF NOT EXISTS instances (
+    type instance_type NOT NULL,
+    publisher VARCHAR NOT NULL,
+    year INTEGER NOT NULL,
+    status instance_status NOT NULL,
+    publication_id VARCHAR NOT NULL REFERENCES publications (id),
+    id VARCHAR NOT NULL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS rentals (
+    id VARCHAR NOT NULL PRIMARY KEY,
+    user_id VARCHAR NOT NULL REFERENCES users (id),
+    publication_instance_id VARCHAR NOT NULL REFERENCES instances (id),
+    duration INTEGER NOT NULL,
+    start_date TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    status rental_status NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    id VARCHAR NOT NULL PRIMARY KEY,
+    user_id VARCHAR NOT NULL REFERENCES users (id),
+    publication_id VARCHAR NOT NULL REFERENCES publications (id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
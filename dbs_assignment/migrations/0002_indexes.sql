@@ -0,0 +1,38 @@
+-- ASSOCIATION TABLES GET COMPOSITE PRIMARY KEYS, DUPLICATE AND DANGLING LINKS ARE DROPPED FIRST
+DELETE FROM publications_authors WHERE publication_id IS NULL OR author_id IS NULL;
+DELETE FROM publications_authors a USING publications_authors b
+    WHERE a.ctid < b.ctid AND a.publication_id = b.publication_id AND a.author_id = b.author_id;
+DO $$ BEGIN
+    ALTER TABLE publications_authors ADD CONSTRAINT publications_authors_pkey PRIMARY KEY (publication_id, author_id);
+EXCEPTION WHEN invalid_table_definition THEN NULL;
+END $$;
+CREATE INDEX IF NOT EXISTS ix_publications_authors_author_id ON publications_authors (author_id);
+
+DELETE FROM publications_categories WHERE publication_id IS NULL OR category_id IS NULL;
+DELETE FROM publications_categories a USING publications_categories b
+    WHERE a.ctid < b.ctid AND a.publication_id = b.publication_id AND a.category_id = b.category_id;
+DO $$ BEGIN
+    ALTER TABLE publications_categories ADD CONSTRAINT publications_categories_pkey PRIMARY KEY (publication_id, category_id);
+EXCEPTION WHEN invalid_table_definition THEN NULL;
+END $$;
+CREATE INDEX IF NOT EXISTS ix_publications_categories_category_id ON publications_categories (category_id);
+
+-- FOREIGN KEYS AND HOT LOOKUPS
+CREATE INDEX IF NOT EXISTS ix_cards_user_id ON cards (user_id);
+CREATE INDEX IF NOT EXISTS ix_rentals_user_id ON rentals (user_id);
+CREATE INDEX IF NOT EXISTS ix_rentals_publication_instance_id ON rentals (publication_instance_id);
+CREATE INDEX IF NOT EXISTS ix_instances_publication_id_status ON instances (publication_id, status);
+CREATE INDEX IF NOT EXISTS ix_reservations_publication_id_created_at ON reservations (publication_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_reservations_user_id ON reservations (user_id);
+CREATE INDEX IF NOT EXISTS ix_authors_name_surname ON authors (name, surname);
+CREATE INDEX IF NOT EXISTS ix_categories_name ON categories (name);
+
+-- KEYSET PAGINATION
+CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_cards_created_at_id ON cards (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_publications_created_at_id ON publications (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_categories_created_at_id ON categories (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_authors_created_at_id ON authors (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_instances_created_at_id ON instances (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_rentals_start_date_id ON rentals (start_date, id);
+CREATE INDEX IF NOT EXISTS ix_reservations_created_at_id ON reservations (created_at, id);
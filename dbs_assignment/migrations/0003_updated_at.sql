@@ -0,0 +1,16 @@
+-- RENTALS AND RESERVATIONS TRACK CHANGES LIKE EVERY OTHER TABLE, EXISTING ROWS START AT THEIR CREATION TIME
+ALTER TABLE rentals ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now();
+UPDATE rentals SET updated_at = start_date WHERE start_date IS NOT NULL;
+
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now();
+UPDATE reservations SET updated_at = created_at WHERE created_at IS NOT NULL;
+
+-- INCREMENTAL EXPORT, WHERE updated_at > :since ORDER BY updated_at, id
+CREATE INDEX IF NOT EXISTS ix_users_updated_at_id ON users (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_cards_updated_at_id ON cards (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_publications_updated_at_id ON publications (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_categories_updated_at_id ON categories (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_authors_updated_at_id ON authors (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_instances_updated_at_id ON instances (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_rentals_updated_at_id ON rentals (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_reservations_updated_at_id ON reservations (updated_at, id);
@@ -0,0 +1,15 @@
+-- AUTHORS ARE IDENTIFIED BY (NAME, SURNAME), DUPLICATES ARE MERGED INTO THE OLDEST ROW BEFORE THE INDEX IS MADE UNIQUE
+CREATE TEMPORARY TABLE author_duplicates ON COMMIT DROP AS
+    SELECT id, first_value(id) OVER (PARTITION BY name, surname ORDER BY created_at, id) AS keep_id
+    FROM authors;
+DELETE FROM author_duplicates WHERE id = keep_id;
+
+INSERT INTO publications_authors (publication_id, author_id)
+    SELECT links.publication_id, duplicates.keep_id
+    FROM publications_authors links JOIN author_duplicates duplicates ON duplicates.id = links.author_id
+    ON CONFLICT DO NOTHING;
+DELETE FROM publications_authors links USING author_duplicates duplicates WHERE links.author_id = duplicates.id;
+DELETE FROM authors USING author_duplicates duplicates WHERE authors.id = duplicates.id;
+
+DROP INDEX IF EXISTS ix_authors_name_surname;
+CREATE UNIQUE INDEX ix_authors_name_surname ON authors (name, surname);
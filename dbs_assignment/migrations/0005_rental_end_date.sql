@@ -0,0 +1,14 @@
+-- end_date WAS A PYTHON PROPERTY SHADOWING A PLAIN, NEVER WRITTEN COLUMN, THAT COLUMN IS REPLACED
+DO $$ BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'rentals' AND column_name = 'end_date' AND is_generated = 'NEVER') THEN
+        ALTER TABLE rentals DROP COLUMN end_date;
+    END IF;
+END $$;
+
+-- timestamptz + interval IS NOT IMMUTABLE, THE DAYS ARE ADDED IN UTC
+ALTER TABLE rentals ADD COLUMN IF NOT EXISTS end_date TIMESTAMP WITH TIME ZONE
+    GENERATED ALWAYS AS (((start_date AT TIME ZONE 'UTC') + duration * interval '1 day') AT TIME ZONE 'UTC') STORED;
+
+-- THE OVERDUE SWEEP ONLY EVER LOOKS AT ACTIVE RENTALS
+CREATE INDEX IF NOT EXISTS ix_rentals_active_end_date ON rentals (end_date) WHERE status = 'active';
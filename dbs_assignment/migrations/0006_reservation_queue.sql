@@ -0,0 +1,22 @@
+-- LAST HANDED OUT POSITION PER PUBLICATION, THE ROW LOCK OF THE UPSERT ORDERS CONCURRENT RESERVATIONS
+CREATE TABLE IF NOT EXISTS reservation_queues (
+    publication_id VARCHAR NOT NULL PRIMARY KEY REFERENCES publications (id) ON DELETE CASCADE,
+    last_position BIGINT NOT NULL DEFAULT 0
+);
+
+-- EXISTING WAITERS KEEP THEIR created_at ORDER
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS queue_position BIGINT;
+
+UPDATE reservations SET queue_position = numbered.position
+FROM (SELECT id, row_number() OVER (PARTITION BY publication_id ORDER BY created_at, id) AS position FROM reservations) numbered
+WHERE reservations.id = numbered.id AND reservations.queue_position IS NULL;
+
+INSERT INTO reservation_queues (publication_id, last_position)
+SELECT publication_id, max(queue_position) FROM reservations GROUP BY publication_id
+ON CONFLICT (publication_id) DO UPDATE SET last_position = GREATEST(reservation_queues.last_position, EXCLUDED.last_position);
+
+ALTER TABLE reservations ALTER COLUMN queue_position SET NOT NULL;
+
+-- HEAD, POSITION AND QUEUE PAGES ARE INDEX ONLY SCANS
+CREATE UNIQUE INDEX IF NOT EXISTS ix_reservations_publication_id_queue_position
+    ON reservations (publication_id, queue_position) INCLUDE (id, user_id, created_at);
@@ -0,0 +1,13 @@
+-- INSTANCE COUNTS PER PUBLICATION AND TYPE, KEPT IN STEP WITH instances BY THE HANDLERS THAT WRITE THEM
+CREATE TABLE IF NOT EXISTS availability_counts (
+    publication_id VARCHAR NOT NULL REFERENCES publications (id) ON DELETE CASCADE,
+    type instance_type NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    available INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (publication_id, type)
+);
+
+INSERT INTO availability_counts (publication_id, type, total, available)
+SELECT publication_id, type, count(*), count(*) FILTER (WHERE status = 'available')
+FROM instances GROUP BY publication_id, type
+ON CONFLICT (publication_id, type) DO UPDATE SET total = EXCLUDED.total, available = EXCLUDED.available;
@@ -0,0 +1,28 @@
+-- STORED SO RANKING A MATCH DOES NOT PARSE THE TEXT AGAIN, THE 'simple' CONFIG DOES NOT STEM
+-- SO SLOVAK AND ENGLISH TITLES ARE MATCHED THE SAME WAY
+ALTER TABLE publications ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', title)) STORED;
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', name || ' ' || surname)) STORED;
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', name)) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_publications_search_vector ON publications USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS ix_authors_search_vector ON authors USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS ix_categories_search_vector ON categories USING gin (search_vector);
+
+-- TYPO TOLERANCE, ONLY WHERE THE SERVER SHIPS pg_trgm, SEARCH FALLS BACK TO FULL TEXT WITHOUT IT
+-- THE QUERIES IN search.py USE THESE EXACT EXPRESSIONS
+DO $$ BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS ix_publications_title_trgm ON publications USING gin (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS ix_authors_full_name_trgm ON authors USING gin ((name || ' ' || surname) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS ix_categories_name_trgm ON categories USING gin (name gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm is not available, search will not tolerate typos';
+    END IF;
+END $$;
+
+-- THE PLANNER NEEDS STATISTICS OF THE NEW COLUMNS TO PICK INDEX LOOKUPS FOR RARE WORDS
+ANALYZE publications, authors, categories;
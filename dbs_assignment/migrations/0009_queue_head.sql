@@ -0,0 +1,10 @@
+-- FIRST POSITION STILL WAITING PER PUBLICATION, last_position + 1 WHILE NOBODY WAITS
+-- A RANK IS queue_position - head_position + 1 AND THE QUEUE LENGTH last_position - head_position + 1, NOTHING IS COUNTED
+ALTER TABLE reservation_queues ADD COLUMN IF NOT EXISTS head_position BIGINT NOT NULL DEFAULT 1;
+
+UPDATE reservation_queues SET head_position = COALESCE(
+    (SELECT min(queue_position) FROM reservations WHERE reservations.publication_id = reservation_queues.publication_id),
+    last_position + 1);
+
+-- THE QUEUE IS READ BY queue_position ONLY, ix_reservations_publication_id_queue_position ALSO SERVES publication_id LOOKUPS
+DROP INDEX IF EXISTS ix_reservations_publication_id_created_at;
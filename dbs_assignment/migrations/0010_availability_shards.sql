@@ -0,0 +1,11 @@
+-- EVERY INSTANCE IS COUNTED IN ONE OF 8 ROWS OF ITS PUBLICATION AND TYPE, PICKED BY THE HASH OF ITS id, SO PARALLEL
+-- CHECKOUTS OF ONE TITLE MOSTLY LOCK DIFFERENT ROWS, availability.counter_shard() COMPUTES THE SAME SHARD
+-- A ROW IS THE EXACT COUNT OF ITS OWN INSTANCES, READERS SUM THE ROWS OR TEST ANY OF THEM FOR > 0
+ALTER TABLE availability_counts ADD COLUMN IF NOT EXISTS shard SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE availability_counts DROP CONSTRAINT IF EXISTS availability_counts_pkey;
+ALTER TABLE availability_counts ADD PRIMARY KEY (publication_id, type, shard);
+
+DELETE FROM availability_counts;
+INSERT INTO availability_counts (publication_id, type, shard, total, available)
+SELECT publication_id, type, get_byte(decode(md5(id), 'hex'), 15) % 8, count(*), count(*) FILTER (WHERE status = 'available')
+FROM instances GROUP BY 1, 2, 3;
@@ -0,0 +1,3 @@
+-- RANKS ARE COUNTED OVER ix_reservations_publication_id_queue_position, A STORED HEAD COUNTED CANCELLED RESERVATIONS
+-- BEHIND IT UNTIL IT PASSED THEM
+ALTER TABLE reservation_queues DROP COLUMN IF EXISTS head_position;
@@ -0,0 +1,30 @@
+from pathlib import Path
+from sqlalchemy import text
+
+MIGRATIONS_DIR = Path(__file__).parent
+
+# ANY CONSTANT WORKS, IT ONLY HAS TO BE THE SAME FOR EVERY PROCESS SHARING THE DATABASE
+MIGRATION_LOCK = 20231001
+
+def migration_files():
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+# APPLIES EVERY *.sql FILE NOT YET RECORDED IN schema_migrations, IN FILENAME ORDER, IN ONE TRANSACTION
+def migrate(engine):
+    applied = []
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK})
+        connection.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR PRIMARY KEY, "
+            "applied_at TIMESTAMP WITH TIME ZONE DEFAULT now())")
+        done = set(connection.scalars(text("SELECT version FROM schema_migrations")))
+
+        for path in migration_files():
+            if path.stem in done:
+                continue
+            connection.exec_driver_sql(path.read_text().replace("%", "%%"))
+            connection.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": path.stem})
+            applied.append(path.stem)
+
+    return applied
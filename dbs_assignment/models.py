@@ -1,31 +1,26 @@
 import uuid
 import random
-from datetime import timedelta
 from typing import List
-from sqlalchemy import DateTime, String, ForeignKey, Table, Integer
+from sqlalchemy import DateTime, String, ForeignKey, Table, Integer, SmallInteger, BigInteger, Index, Computed
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
-from sqlalchemy.orm import relationship
-from .database import Base, engine
-from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy.orm import relationship, query_expression, deferred
+from .database import Base
+from sqlalchemy.dialects.postgresql import ENUM, TSVECTOR
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 
 card_statuses = ['active', 'expired', 'inactive']
 CardStatusEnum = ENUM(*card_statuses, name='card_status', create_type=False)
-CardStatusEnum.create(bind=engine, checkfirst=True)
 
 instance_types = ['physical', 'ebook', 'audiobook']
 InstanceTypeEnum = ENUM(*instance_types, name='instance_type', create_type=False)
-InstanceTypeEnum.create(bind=engine, checkfirst=True)
 
 instance_statuses = [ 'available', 'reserved' ]
 InstanceStatusEnum = ENUM(*instance_statuses, name='instance_status', create_type=False)
-InstanceStatusEnum.create(bind=engine, checkfirst=True)
 
 rental_statuses = [ 'active', 'returned', 'overdue' ]
 RentalStatusEnum = ENUM(*rental_statuses, name='rental_status', create_type=False)
-RentalStatusEnum.create(bind=engine, checkfirst=True)
 
 random.seed(12345)
 
@@ -34,6 +29,9 @@ class Entity():
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
+    # FETCH SERVER GENERATED VALUES WITH RETURNING, NO LAZY REFRESH AFTER COMMIT
+    __mapper_args__ = {"eager_defaults": True}
+
 class User(Base, Entity):
     __tablename__ = 'users'
     name = Column(String, nullable=False)
@@ -56,17 +54,18 @@ class Card(Base, Entity):
     status = Column(CardStatusEnum, nullable=False)
 
 publications_authors = Table('publications_authors', Base.metadata,
-    Column('publication_id', String, ForeignKey('publications.id')),
-    Column('author_id', String, ForeignKey('authors.id'))
+    Column('publication_id', String, ForeignKey('publications.id'), primary_key=True),
+    Column('author_id', String, ForeignKey('authors.id'), primary_key=True)
 )
 publications_categories = Table('publications_categories', Base.metadata,
-    Column('publication_id', String, ForeignKey('publications.id')),
-    Column('category_id', String, ForeignKey('categories.id'))
+    Column('publication_id', String, ForeignKey('publications.id'), primary_key=True),
+    Column('category_id', String, ForeignKey('categories.id'), primary_key=True)
 )
 
 class Publication(Base, Entity):
     __tablename__ = 'publications'
     title = Column(String, nullable=False)
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', title)", persisted=True)))
 
     # MANY PUBLICATIONS CAN HAVE MANY AUTHORS
     authors : Mapped[List["Author"]] = relationship(secondary=publications_authors)
@@ -79,9 +78,14 @@ class Publication(Base, Entity):
     # PUBLICATION CAN HAVE MANY RESERVATIONS
     reservations : Mapped[List["Reservation"]] = relationship(cascade="delete, delete-orphan")
 
+    # FILLED FROM availability_counts BY QUERIES THAT ASK FOR THEM WITH with_expression
+    total_instances = query_expression()
+    available_instances = query_expression()
+
 class Category(Base, Entity):
     __tablename__ = 'categories'
     name = Column(String, nullable=False)
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', name)", persisted=True)))
 
     publications: Mapped[List["Publication"]] = relationship(secondary=publications_categories, back_populates="categories")
 
@@ -89,6 +93,7 @@ class Author(Base, Entity):
     __tablename__ = 'authors'
     name = Column(String, nullable=False)
     surname = Column(String, nullable=False)
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', name || ' ' || surname)", persisted=True)))
 
     publications: Mapped[List["Publication"]] = relationship(secondary=publications_authors, back_populates="authors")
 
@@ -111,12 +116,11 @@ class Rental(Base):
     publication_instance_id : Mapped[String] = mapped_column(ForeignKey("instances.id"))
     duration = Column(Integer, nullable=False)
     start_date = Column(DateTime(timezone=True), server_default=func.now())
-    end_date = Column(DateTime(timezone=True))
+    end_date = Column(DateTime(timezone=True), Computed("((start_date AT TIME ZONE 'UTC') + duration * interval '1 day') AT TIME ZONE 'UTC'", persisted=True))
     status = Column(RentalStatusEnum, default='active', nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
-    @property
-    def end_date(self):
-        return self.start_date + timedelta(days=self.duration)
+    __mapper_args__ = {"eager_defaults": True}
 
 class Reservation(Base):
     __tablename__ = 'reservations'
@@ -124,4 +128,71 @@ class Reservation(Base):
 
     user_id : Mapped[String] = mapped_column(ForeignKey("users.id"))
     publication_id : Mapped[String] = mapped_column(ForeignKey("publications.id"))
+    queue_position = Column(BigInteger, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+    __mapper_args__ = {"eager_defaults": True}
+
+# LAST QUEUE POSITION HANDED OUT AND FIRST ONE STILL WAITING PER PUBLICATION
+reservation_queues = Table('reservation_queues', Base.metadata,
+    Column('publication_id', String, ForeignKey('publications.id', ondelete="CASCADE"), primary_key=True),
+    Column('last_position', BigInteger, nullable=False, server_default="0")
+)
+
+# INSTANCES PER PUBLICATION AND TYPE, SPLIT INTO SHARDS BY THE HASH OF THE INSTANCE id
+availability_counts = Table('availability_counts', Base.metadata,
+    Column('publication_id', String, ForeignKey('publications.id', ondelete="CASCADE"), primary_key=True),
+    Column('type', InstanceTypeEnum, primary_key=True),
+    Column('shard', SmallInteger, primary_key=True, server_default="0"),
+    Column('total', Integer, nullable=False, server_default="0"),
+    Column('available', Integer, nullable=False, server_default="0")
+)
+
+# THE INDEXES BELOW ARE CREATED BY migrations/, create_all NEVER ADDS AN INDEX TO A TABLE THAT ALREADY EXISTS, SO
+# DECLARING ONE HERE DOES NOTHING FOR A RUNNING DATABASE WITHOUT ITS MIGRATION, benchmarks.explain_indexes CHECKS BOTH AGREE
+
+# KEYSET PAGINATION INDEXES, 0002_indexes
+Index("ix_users_created_at_id", User.created_at, User.id)
+Index("ix_cards_created_at_id", Card.created_at, Card.id)
+Index("ix_publications_created_at_id", Publication.created_at, Publication.id)
+Index("ix_categories_created_at_id", Category.created_at, Category.id)
+Index("ix_authors_created_at_id", Author.created_at, Author.id)
+Index("ix_instances_created_at_id", Instance.created_at, Instance.id)
+Index("ix_rentals_start_date_id", Rental.start_date, Rental.id)
+Index("ix_reservations_created_at_id", Reservation.created_at, Reservation.id)
+
+# AVAILABILITY LOOKUP, 0002_indexes
+Index("ix_instances_publication_id_status", Instance.publication_id, Instance.status)
+
+# FOREIGN KEYS AND HOT LOOKUPS, 0002_indexes
+Index("ix_publications_authors_author_id", publications_authors.c.author_id)
+Index("ix_publications_categories_category_id", publications_categories.c.category_id)
+Index("ix_cards_user_id", Card.user_id)
+Index("ix_rentals_user_id", Rental.user_id)
+Index("ix_rentals_publication_instance_id", Rental.publication_instance_id)
+Index("ix_reservations_user_id", Reservation.user_id)
+Index("ix_authors_name_surname", Author.name, Author.surname, unique=True)
+Index("ix_categories_name", Category.name)
+
+# INCREMENTAL EXPORT, 0003_updated_at
+Index("ix_users_updated_at_id", User.updated_at, User.id)
+Index("ix_cards_updated_at_id", Card.updated_at, Card.id)
+Index("ix_publications_updated_at_id", Publication.updated_at, Publication.id)
+Index("ix_categories_updated_at_id", Category.updated_at, Category.id)
+Index("ix_authors_updated_at_id", Author.updated_at, Author.id)
+Index("ix_instances_updated_at_id", Instance.updated_at, Instance.id)
+Index("ix_rentals_updated_at_id", Rental.updated_at, Rental.id)
+Index("ix_reservations_updated_at_id", Reservation.updated_at, Reservation.id)
+
+# OVERDUE SWEEP, 0005_rental_end_date
+Index("ix_rentals_active_end_date", Rental.end_date, postgresql_where=Rental.status == "active")
+
+# RESERVATION QUEUE, 0006_reservation_queue
+Index("ix_reservations_publication_id_queue_position", Reservation.publication_id, Reservation.queue_position,
+      unique=True, postgresql_include=["id", "user_id", "created_at"])
+
+# SEARCH, 0008_search, THE TRIGRAM INDEXES ONLY EXIST WHERE pg_trgm IS INSTALLED
+Index("ix_publications_search_vector", Publication.search_vector, postgresql_using="gin")
+Index("ix_authors_search_vector", Author.search_vector, postgresql_using="gin")
+Index("ix_categories_search_vector", Category.search_vector, postgresql_using="gin")
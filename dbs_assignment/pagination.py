@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import status, HTTPException
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# CURSOR IS THE (created_at, id) OF THE LAST ROW ON THE PAGE, BASE64 SO CLIENTS TREAT IT AS OPAQUE
+def encode_cursor(created_at: datetime, id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+# QUEUE PAGES ARE ORDERED BY queue_position ALONE, THE CURSOR IS THE LAST POSITION ON THE PAGE
+def encode_position_cursor(position: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([position]).encode()).decode().rstrip("=")
+
+def decode_position_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position, = json.loads(raw)
+        return int(position)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+# SEARCH PAGES ARE ORDERED BY (score DESC, id), THE CURSOR IS THE PAIR OF THE LAST HIT
+def encode_score_cursor(score: float, id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, id]).encode()).decode().rstrip("=")
+
+def decode_score_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, id = json.loads(raw)
+        return float(score), str(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+# KEYSET PAGINATION, EVERY PAGE IS ONE INDEX RANGE SCAN NO MATTER HOW DEEP
+async def paginate(db, statement, created_column, id_column, cursor: str, limit: int):
+    if cursor:
+        statement = statement.where(tuple_(created_column, id_column) > decode_cursor(cursor))
+
+    statement = statement.order_by(created_column, id_column).limit(limit + 1)
+    items = (await db.scalars(statement)).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+    return items, next_cursor
@@ -0,0 +1,57 @@
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from .models import Reservation, reservation_queues
+
+# NEXT POSITION OF THE PUBLICATION QUEUE, POSITIONS ONLY GROW SO NOBODY IS EVER RENUMBERED
+async def enqueue(db, publication_id: str) -> int:
+    statement = insert(reservation_queues).values(publication_id=publication_id, last_position=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[reservation_queues.c.publication_id],
+        set_={"last_position": reservation_queues.c.last_position + 1})
+    return await db.scalar(statement.returning(reservation_queues.c.last_position))
+
+# FIRST WAITER, THE SMALLEST queue_position OF THE PUBLICATION
+async def queue_head(db, publication_id: str):
+    return (await db.execute(select(Reservation.id, Reservation.user_id)
+        .where(Reservation.publication_id == publication_id)
+        .order_by(Reservation.queue_position).limit(1))).first()
+
+# HELD UNTIL THE TRANSACTION ENDS BY EVERYONE WHO READS THE HEAD TO ACT ON IT OR REMOVES A WAITER, A HEAD READ AFTER IT
+# SEES EVERY REMOVAL COMMITTED BY WHOEVER HELD IT BEFORE
+async def lock_queue(db, publication_id: str):
+    await db.execute(select(reservation_queues.c.publication_id)
+        .where(reservation_queues.c.publication_id == publication_id).with_for_update())
+
+# A RESERVATION LEAVES THE QUEUE WHEN ITS RENTAL IS CREATED OR IT IS CANCELLED
+async def dequeue(db, publication_id: str, reservation_id: str):
+    await lock_queue(db, publication_id)
+    await db.execute(delete(Reservation).where(Reservation.id == reservation_id))
+
+# WAITERS OF THE PUBLICATION AT OR BEFORE position AND IN TOTAL, ONE INDEX ONLY SCAN OF (publication_id, queue_position)
+# THAT READS NOTHING BUT THE PUBLICATION'S OWN QUEUE, CANCELLED RESERVATIONS ARE GONE FROM IT SO NOTHING IS SKIPPED
+async def queue_counts(db, publication_id: str, position: int):
+    return (await db.execute(select(
+        func.count().filter(Reservation.queue_position <= position).label("ahead"),
+        func.count().label("waiting"))
+        .where(Reservation.publication_id == publication_id))).first()
+
+# 1 BASED RANK AND QUEUE LENGTH
+async def queue_position(db, reservation):
+    ahead, waiting = await queue_counts(db, reservation.publication_id, reservation.queue_position)
+    return {"id": reservation.id, "publication_id": reservation.publication_id, "position": ahead, "waiting": waiting}
+
+# A PAGE CONTINUES THE RANKS OF THE WAITERS BEFORE ITS CURSOR
+async def queue_page(db, publication_id: str, after, limit: int):
+    statement = select(Reservation.id, Reservation.user_id, Reservation.publication_id, Reservation.created_at, Reservation.queue_position).where(
+        Reservation.publication_id == publication_id)
+    if after is not None:
+        statement = statement.where(Reservation.queue_position > after)
+    rows = (await db.execute(statement.order_by(Reservation.queue_position).limit(limit + 1))).all()
+
+    ahead = 0
+    if rows and after is not None:
+        ahead = (await queue_counts(db, publication_id, after)).ahead
+
+    items = [{**row._mapping, "position": ahead + rank} for rank, row in enumerate(rows[:limit], 1)]
+    next_position = rows[limit - 1].queue_position if len(rows) > limit else None
+    return items, next_position
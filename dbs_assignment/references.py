@@ -0,0 +1,61 @@
+from sqlalchemy import select, delete, union_all, tuple_, literal_column, null
+from sqlalchemy.dialects.postgresql import insert
+from .models import Author, Category, publications_authors, publications_categories
+from .cache import reference_cache
+
+def author_keys(authors: list) -> list:
+    return list(dict.fromkeys((author["name"], author["surname"]) for author in authors))
+
+# EXACT (NAME, SURNAME) AND CATEGORY NAME MATCHES FOR EVERY REFERENCE, CACHED NAMES ARE SKIPPED
+# AND THE REST IS FETCHED IN ONE ROUND TRIP, RETURNS {(name, surname): author_id} AND {name: category_id}
+async def resolve_references(db, authors: list, categories: list):
+    author_ids, category_ids = {}, {}
+    for key in author_keys(authors):
+        author_id = reference_cache.get(("author_name", *key))
+        if author_id is not None:
+            author_ids[key] = author_id
+    for name in dict.fromkeys(categories):
+        category_id = reference_cache.get(("category_name", name))
+        if category_id is not None:
+            category_ids[name] = category_id
+
+    uncached_authors = [key for key in author_keys(authors) if key not in author_ids]
+    uncached_categories = [name for name in dict.fromkeys(categories) if name not in category_ids]
+
+    statements = []
+    if uncached_authors:
+        statements.append(select(literal_column("'author'").label("kind"), Author.id, Author.name, Author.surname)
+            .where(tuple_(Author.name, Author.surname).in_(uncached_authors)))
+    if uncached_categories:
+        statements.append(select(literal_column("'category'").label("kind"), Category.id, Category.name, null())
+            .where(Category.name.in_(uncached_categories)))
+    if not statements:
+        return author_ids, category_ids
+
+    statement = statements[0] if len(statements) == 1 else union_all(*statements)
+    generation = reference_cache.generation()
+    for kind, id, name, surname in (await db.execute(statement)).all():
+        if kind == "author":
+            author_ids[(name, surname)] = id
+            reference_cache.set(("author_name", name, surname), id, generation)
+        else:
+            category_ids[name] = id
+            reference_cache.set(("category_name", name), id, generation)
+    return author_ids, category_ids
+
+def missing_references(authors: list, categories: list, author_ids: dict, category_ids: dict) -> list:
+    missing = [f"{name} {surname}" for name, surname in author_keys(authors) if (name, surname) not in author_ids]
+    missing += [category for category in dict.fromkeys(categories) if category not in category_ids]
+    return missing
+
+# ASSOCIATION ROWS AS MULTI ROW INSERTS, replace DROPS THE CURRENT LINKS OF THE PUBLICATION FIRST
+async def link_publication(db, publication_id: str, author_ids: list, category_ids: list, replace: bool = False):
+    if replace:
+        await db.execute(delete(publications_authors).where(publications_authors.c.publication_id == publication_id))
+        await db.execute(delete(publications_categories).where(publications_categories.c.publication_id == publication_id))
+    if author_ids:
+        await db.execute(insert(publications_authors).on_conflict_do_nothing(),
+            [{"publication_id": publication_id, "author_id": author_id} for author_id in dict.fromkeys(author_ids)])
+    if category_ids:
+        await db.execute(insert(publications_categories).on_conflict_do_nothing(),
+            [{"publication_id": publication_id, "category_id": category_id} for category_id in dict.fromkeys(category_ids)])
@@ -8,6 +8,10 @@ from dbs_assignment.endpoints.users import users_router
 from dbs_assignment.endpoints.cards import cards_router
 from dbs_assignment.endpoints.rentals import rentals_router
 from dbs_assignment.endpoints.reservations import reservations_router
+from dbs_assignment.endpoints.stats import stats_router
+from dbs_assignment.endpoints.export import export_router
+from dbs_assignment.endpoints.search import search_router
+from dbs_assignment.endpoints.batch import batch_router
 
 router = APIRouter()
 
@@ -18,4 +22,8 @@ router.include_router(instances_router, tags=["instances_router"])
 router.include_router(users_router, tags=["users_router"])
 router.include_router(cards_router, tags=["cards_router"])
 router.include_router(rentals_router, tags=["rentals_router"])
-router.include_router(reservations_router, tags=["reservations_router"])
\ No newline at end of file
+router.include_router(reservations_router, tags=["reservations_router"])
+router.include_router(stats_router, tags=["stats_router"])
+router.include_router(export_router, tags=["export_router"])
+router.include_router(search_router, tags=["search_router"])
+router.include_router(batch_router, tags=["batch_router"])
\ No newline at end of file
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, validator
+from pydantic.generics import GenericModel
 from datetime import datetime,timezone
 from fastapi import status, HTTPException
-from typing import Optional
+from typing import Any, Optional, Generic, TypeVar
 from uuid import UUID
 import re
 
@@ -31,6 +32,27 @@ class Response(BaseModel):
     class Config:
         orm_mode = True
 
+# PAGINATION
+T = TypeVar('T')
+
+class Page(GenericModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+
+# BULK IMPORT
+class BulkError(BaseModel):
+    line: Optional[int] = None
+    id: Optional[str] = None
+    error: str
+class BulkResult(BaseModel):
+    resource: str
+    received: int
+    inserted: int
+    failed: int
+    errors: list[BulkError]
+    seconds: float
+    rows_per_second: float
+
 # CATEGORY
 class CategoryRequest(Request):
     name: str
@@ -100,6 +122,55 @@ class PublicationResponse(Response):
     authors: list[dict[str, str]]
     categories: list[str]
 
+class PublicationSummary(PublicationResponse):
+    total : int
+    available : int
+class CategoryFacet(BaseModel):
+    id : str
+    name : str
+    count : int
+class AuthorFacet(BaseModel):
+    id : str
+    name : str
+    surname : str
+    count : int
+class PublicationFacets(BaseModel):
+    results : int
+    categories : list[CategoryFacet]
+    authors : list[AuthorFacet]
+    types : dict[str, int]
+    years : dict[str, int]
+    estimated : bool
+class PublicationPage(Page[PublicationSummary]):
+    facets : Optional[PublicationFacets] = None
+
+# AVAILABILITY
+class AvailabilityCount(BaseModel):
+    total: int
+    available: int
+class AvailabilityResponse(BaseModel):
+    publication_id: str
+    total: int
+    available: int
+    types: dict[str, AvailabilityCount]
+
+# SEARCH
+class SearchHit(BaseModel):
+    id : str
+    title : str
+    score : float
+    total : int
+    available : int
+class SearchFacets(BaseModel):
+    results : int
+    available : int
+    types : dict[str, int]
+    estimated : bool
+class SearchPage(BaseModel):
+    items : list[SearchHit]
+    next_cursor : Optional[str] = None
+    facets : Optional[SearchFacets] = None
+
 # INSTANCE
 class InstanceRequest(Request):
     type : Optional[str] = None
@@ -280,6 +351,15 @@ class ReservationResponse(BaseModel):
     class Config:
         orm_mode = True
 
+# RESERVATION QUEUE
+class QueueEntry(ReservationResponse):
+    position : int
+class QueuePosition(BaseModel):
+    id : str
+    publication_id : str
+    position : int
+    waiting : int
+
 # USER
 class UserRequest(Request):
     name : str
@@ -356,3 +436,18 @@ class UserResponse(Response):
     @validator('birth_date')
     def format_birth(cls, value):
         return cls.to_date_format(value)
+
+# BATCH
+class BatchOperation(BaseModel):
+    method : str
+    path : str
+    body : Optional[Any] = None
+class BatchRequest(BaseModel):
+    operations : list[BatchOperation]
+    atomic : bool = False
+class BatchOperationResult(BaseModel):
+    status : int
+    body : Optional[Any] = None
+class BatchResponse(BaseModel):
+    committed : bool
+    results : list[BatchOperationResult]
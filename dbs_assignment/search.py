@@ -0,0 +1,135 @@
+import re
+from sqlalchemy import select, func, literal, literal_column, union_all, and_, or_, exists, cast, text, Float
+from .configuration import conf
+from .facets import hash_sample
+from .models import Publication, Author, Category, publications_authors, publications_categories, availability_counts, instance_types
+
+SIMPLE = literal_column("'simple'")
+
+# SAME EXPRESSION AS THE TRIGRAM INDEX IN migrations/0008_search.sql, A BOUND ' ' WOULD NOT MATCH IT
+def author_full_name():
+    return Author.name + literal_column("' '") + Author.surname
+
+# A MATCH IN THE TITLE COUNTS MORE THAN ONE IN AN AUTHOR'S NAME, WHICH COUNTS MORE THAN A CATEGORY
+SOURCES = {"title": 1.0, "author": 0.6, "category": 0.3}
+
+# TRIGRAM SIMILARITY IS 0..1 AND ts_rank OF A SHORT TEXT IS ~0.06 PER MATCHED WORD, SCALED SO AN EXACT WORD
+# STILL OUTRANKS A TYPO
+TRIGRAM_WEIGHT = 0.1
+
+# EVERY WORD AS A PREFIX, ANY OF THEM MAY MATCH AND MORE MATCHED WORDS RANK HIGHER, None WHEN q HAS NO WORDS
+def prefix_query(q: str):
+    words = re.findall(r"\w+", q.lower())
+    if not words:
+        return None
+    return " | ".join(f"{word}:*" for word in dict.fromkeys(words))
+
+trigram_enabled = None
+
+# pg_trgm IS OPTIONAL, CHECKED ONCE PER PROCESS
+async def has_trigram(db) -> bool:
+    global trigram_enabled
+    if trigram_enabled is None:
+        trigram_enabled = bool(await db.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")))
+    return trigram_enabled
+
+# THE GROUPED MATCH SET IS ALWAYS ESTIMATED AT 200 ROWS AND THE PLANNER THEN PREFERS A PARALLEL SORT AND GATHER
+# MERGE THAT IS ABOUT TWICE AS SLOW AS ONE HASH AGGREGATE, WHICH NEEDS MORE THAN THE DEFAULT 4MB FOR A COMMON WORD
+# LOCAL SO BOTH END WITH THE REQUEST'S TRANSACTION
+async def prepare_search(db):
+    await db.execute(text("SELECT set_config('max_parallel_workers_per_gather', '0', true), set_config('work_mem', :work_mem, true)")
+        .bindparams(work_mem=conf.SEARCH_WORK_MEM))
+
+# (publication_id, source, score) FOR EVERY TITLE, AUTHOR AND CATEGORY HIT, EACH BRANCH IS ONE GIN INDEX SCAN
+def match_branches(q: str, tsquery: str, trigram: bool):
+    query = func.to_tsquery(SIMPLE, tsquery)
+    title, full_name, category = Publication.search_vector, Author.search_vector, Category.search_vector
+
+    branches = [
+        select(Publication.id.label("publication_id"), literal("title").label("source"), func.ts_rank(title, query).label("score"))
+            .where(title.op("@@")(query)),
+        select(publications_authors.c.publication_id, literal("author"), func.ts_rank(full_name, query))
+            .join(Author, Author.id == publications_authors.c.author_id).where(full_name.op("@@")(query)),
+        select(publications_categories.c.publication_id, literal("category"), func.ts_rank(category, query))
+            .join(Category, Category.id == publications_categories.c.category_id).where(category.op("@@")(query)),
+    ]
+    if trigram:
+        branches += [
+            select(Publication.id, literal("title"), func.word_similarity(q, Publication.title) * TRIGRAM_WEIGHT)
+                .where(literal(q).op("<%")(Publication.title)),
+            select(publications_authors.c.publication_id, literal("author"), func.word_similarity(q, author_full_name()) * TRIGRAM_WEIGHT)
+                .join(Author, Author.id == publications_authors.c.author_id).where(literal(q).op("<%")(author_full_name())),
+            select(publications_categories.c.publication_id, literal("category"), func.word_similarity(q, Category.name) * TRIGRAM_WEIGHT)
+                .join(Category, Category.id == publications_categories.c.category_id).where(literal(q).op("<%")(Category.name)),
+        ]
+    return union_all(*branches).subquery("matches")
+
+# ONE SCORE PER PUBLICATION, THE BEST HIT OF EACH SOURCE WEIGHTED AND SUMMED IN A FIXED ORDER
+# SO A PUBLICATION GETS A BIT IDENTICAL SCORE ON EVERY PAGE, THE CURSOR COMPARES IT
+def scored_publications(q: str, tsquery: str, trigram: bool, available: bool = None, instance_type: str = None):
+    matches = match_branches(q, tsquery, trigram)
+    score = sum(
+        func.coalesce(func.max(cast(matches.c.score, Float)).filter(matches.c.source == source), 0) * weight
+        for source, weight in SOURCES.items())
+    statement = select(matches.c.publication_id, score.label("score")).group_by(matches.c.publication_id)
+
+    counters = [availability_counts.c.publication_id == matches.c.publication_id]
+    if instance_type is not None:
+        counters.append(availability_counts.c.type == instance_type)
+    if available is not None:
+        condition = exists().where(*counters, availability_counts.c.available > 0)
+        statement = statement.where(condition if available else ~condition)
+    elif instance_type is not None:
+        statement = statement.where(exists().where(*counters, availability_counts.c.total > 0))
+    return statement.cte("scored")
+
+# KEYSET PAGE ORDERED BY score DESC, id, ONLY THE HITS ON THE PAGE ARE JOINED TO THEIR TITLE AND COUNTERS
+async def search_page(db, scored, after, limit: int):
+    page = select(scored.c.publication_id, scored.c.score)
+    if after is not None:
+        score, id = after
+        page = page.where(or_(scored.c.score < score, and_(scored.c.score == score, scored.c.publication_id > id)))
+    page = page.order_by(scored.c.score.desc(), scored.c.publication_id).limit(limit + 1).subquery("page")
+
+    total = func.coalesce(func.sum(availability_counts.c.total), 0)
+    available = func.coalesce(func.sum(availability_counts.c.available), 0)
+    statement = (select(Publication.id, Publication.title, page.c.score, total.label("total"), available.label("available"))
+        .select_from(page)
+        .join(Publication, Publication.id == page.c.publication_id)
+        .outerjoin(availability_counts, availability_counts.c.publication_id == page.c.publication_id)
+        .group_by(Publication.id, Publication.title, page.c.score)
+        .order_by(page.c.score.desc(), Publication.id))
+
+    rows = (await db.execute(statement)).all()
+    items = [{"id": row.id, "title": row.title, "score": row.score, "total": row.total, "available": row.available} for row in rows[:limit]]
+    next_key = (rows[limit - 1].score, rows[limit - 1].id) if len(rows) > limit else None
+    return items, next_key
+
+# HOW MANY PUBLICATIONS MATCHED AND HOW MANY HAVE A COPY AVAILABLE, IN TOTAL AND PER INSTANCE TYPE, ONE ROLLUP QUERY
+# PAST SEARCH_FACET_LIMIT MATCHES THE AVAILABILITY IS COUNTED OVER A HASH SAMPLE OF ABOUT THAT SIZE AND SCALED UP
+async def search_facets(db, scored):
+    limit = conf.SEARCH_FACET_LIMIT
+    sample = hash_sample(scored, scored.c.publication_id, limit)
+
+    rows = (await db.execute(select(
+        func.grouping(availability_counts.c.type).label("overall"),
+        availability_counts.c.type,
+        func.count(sample.c.publication_id.distinct()),
+        func.count(sample.c.publication_id.distinct()).filter(availability_counts.c.available > 0),
+        func.max(sample.c.results))
+        .select_from(sample)
+        .outerjoin(availability_counts, availability_counts.c.publication_id == sample.c.publication_id)
+        .group_by(func.rollup(availability_counts.c.type)))).all()
+
+    overall = next((row for row in rows if row.overall), None)
+    results = (overall[4] if overall is not None else None) or 0
+    sampled = overall[2] if overall is not None else 0
+    scale = results / sampled if sampled else 1.0
+
+    facets = {"results": results, "available": 0, "types": {instance_type: 0 for instance_type in instance_types}, "estimated": results > limit}
+    for is_overall, instance_type, _, with_available, _ in rows:
+        if is_overall:
+            facets["available"] = round(with_available * scale)
+        elif instance_type is not None:
+            facets["types"][instance_type] = round(with_available * scale)
+    return facets
@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from fastapi.routing import APIRoute
+from .configuration import conf
+from .schemas import Page
+
+DATE_FIELDS = {"birth_date"}
+
+# SAME OUTPUT AS THE Response VALIDATORS, '2023-05-01T10:11:12.123Z'
+def format_timestamp(value: datetime) -> str:
+    if value.tzinfo is not timezone.utc:
+        value = value.astimezone(timezone.utc)
+    return value.replace(tzinfo=None).isoformat(timespec="milliseconds") + "Z"
+
+def format_date(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%d')
+
+# ALL TIMESTAMPS OF A PAGE ARE FORMATTED IN ONE PASS, created_at == updated_at IS FORMATTED ONCE
+def format_timestamps(rows: list, fields: list):
+    formatted = {}
+    for row in rows:
+        for field in fields:
+            value = row[field]
+            if isinstance(value, datetime):
+                text = formatted.get(value)
+                if text is None:
+                    text = formatted[value] = format_timestamp(value)
+                row[field] = text
+    return rows
+
+# ROW TO DICT FUNCTION BUILT ONCE PER RESPONSE SCHEMA, NO PYDANTIC MODEL IS CREATED PER ROW
+def row_serializer(schema):
+    names = list(schema.__fields__)
+    timestamps = [name for name, field in schema.__fields__.items() if field.type_ is datetime and name not in DATE_FIELDS]
+    dates = [name for name in names if name in DATE_FIELDS]
+    defaults = {name: field.default for name, field in schema.__fields__.items()}
+
+    def read(value):
+        if isinstance(value, dict):
+            row = {name: value.get(name, defaults[name]) for name in names}
+        else:
+            row = {name: getattr(value, name) for name in names}
+        for name in dates:
+            if isinstance(row[name], datetime):
+                row[name] = format_date(row[name])
+        return row
+
+    def serialize_many(values):
+        return format_timestamps([read(value) for value in values], timestamps)
+
+    return serialize_many
+
+def serializer_for(schema):
+    if issubclass(schema, Page):
+        serialize_items = row_serializer(schema.__fields__["items"].type_)
+        extra = [name for name in schema.__fields__ if name not in ("items", "next_cursor")]
+
+        # FIELDS A PAGE SUBCLASS ADDS, LIKE facets, ARE PLAIN DICTS AND PASS THROUGH AS THEY ARE
+        def serialize_page(value):
+            page = {"items": serialize_items(value["items"]), "next_cursor": value.get("next_cursor")}
+            for name in extra:
+                page[name] = value.get(name)
+            return page
+        return serialize_page
+
+    serialize_rows = row_serializer(schema)
+    return lambda value: serialize_rows([value])[0]
+
+SERIALIZERS = {}
+
+def serialize(schema, value):
+    serializer = SERIALIZERS.get(schema)
+    if serializer is None:
+        serializer = SERIALIZERS[schema] = serializer_for(schema)
+    return serializer(value)
+
+# BODY OF A response_model RESPONSE, THROUGH PYDANTIC AND json OR THE PRECOMPUTED SERIALIZER AND orjson
+def render(schema, value) -> bytes:
+    if conf.FAST_SERIALIZATION:
+        return ORJSONResponse(serialize(schema, value)).body
+    model = schema.parse_obj(value) if isinstance(value, dict) else schema.from_orm(value)
+    return JSONResponse(jsonable_encoder(model)).body
+
+# ROUTE WHOSE response_model IS APPLIED BY serialize() INSTEAD OF VALIDATING THE RETURN VALUE
+# A RETURN VALUE THAT DOES NOT FIT THE SCHEMA (A MISSING OR None REQUIRED FIELD) IS NOT REJECTED WITH A 500 BUT SENT AS IT
+# IS, FAST_SERIALIZATION=false VALIDATES EVERY RESPONSE AGAIN AND IS THE WAY TO DEBUG ONE
+class SerializingRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        if not conf.FAST_SERIALIZATION or self.response_model is None:
+            return
+
+        call = self.dependant.call
+        schema = self.response_model
+        status_code = self.status_code or 200
+
+        async def serialized_call(**values):
+            value = await call(**values)
+            if isinstance(value, Response):
+                return value
+            return ORJSONResponse(serialize(schema, value), status_code=status_code)
+
+        self.dependant.call = serialized_call
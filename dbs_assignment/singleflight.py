@@ -0,0 +1,75 @@
+import asyncio
+from collections import Counter
+from sqlalchemy import inspect, select
+from .database import SessionLocal, batch_session
+
+# CONCURRENT CALLS WITH THE SAME KEY SHARE ONE EXECUTION AND ALL GET ITS RESULT OR EXCEPTION
+# fn(db, *args) RUNS ON A SESSION OF THE FLIGHT ITSELF, NEVER ON A CALLER'S, AND MUST RETURN PLAIN VALUES (DICTS, NOT ORM
+# OBJECTS) SINCE EVERY CALLER GETS THE SAME RESULT AFTER THE SESSION IS CLOSED
+# A CALLER CAN ONLY JOIN WHILE THE FLIGHT WAITS FOR ITS CONNECTION, ONCE IT HAS ONE THE NEXT CALLER STARTS A NEW FLIGHT, SO
+# EVERY JOINED CALLER ARRIVED BEFORE THE FLIGHT'S FIRST STATEMENT AND SEES EVERYTHING COMMITTED BEFORE IT ARRIVED
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.running = 0
+        self.executed = Counter()
+        self.coalesced = Counter()
+
+    async def run(self, key: tuple, flight_id: object, fn, args):
+        self.running += 1
+        db = SessionLocal()
+        try:
+            await db.connection()
+            self.close(key, flight_id)
+            return await fn(db, *args)
+        finally:
+            await db.close()
+            self.running -= 1
+
+    def close(self, key: tuple, flight_id: object):
+        if self.flights.get(key, (None,))[0] is flight_id:
+            del self.flights[key]
+
+    async def do(self, key: tuple, fn, *args):
+        # THE OPERATIONS OF ONE POST /batch SHARE ITS UNCOMMITTED TRANSACTION, NOBODY ELSE MAY SEE IT
+        db = batch_session.get()
+        if db is not None:
+            return await fn(db, *args)
+
+        entry = self.flights.get(key)
+        if entry is None:
+            flight_id = object()
+            flight = asyncio.ensure_future(self.run(key, flight_id, fn, args))
+            self.flights[key] = (flight_id, flight)
+            flight.add_done_callback(lambda done: self.close(key, flight_id))
+            self.executed[key[0]] += 1
+            return await flight
+
+        self.coalesced[key[0]] += 1
+        flight = entry[1]
+        try:
+            return await asyncio.shield(flight)
+        except asyncio.CancelledError:
+            # THE FIRST CALLER WENT AWAY AND TOOK THE CALL WITH IT, RUN IT AGAIN UNLESS THIS CALLER WAS CANCELLED TOO
+            if not flight.cancelled():
+                raise
+            return await self.do(key, fn, *args)
+
+    def stats(self):
+        return {
+            "in_flight": self.running,
+            "joinable": len(self.flights),
+            "executed": sum(self.executed.values()),
+            "coalesced": sum(self.coalesced.values()),
+            "by_kind": {kind: {"executed": self.executed[kind], "coalesced": self.coalesced[kind]}
+                        for kind in sorted(self.executed.keys() | self.coalesced.keys())},
+        }
+
+# COLUMN VALUES OF ONE ROW BY id, DEFERRED COLUMNS (search_vector) ARE LEFT OUT
+async def fetch_row(db, model, id: str):
+    item = await db.scalar(select(model).where(model.id == id))
+    if item is None:
+        return None
+    return {prop.key: getattr(item, prop.key) for prop in inspect(model).column_attrs if not prop.deferred}
+
+flights = SingleFlight()
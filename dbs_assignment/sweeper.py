@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import select, update, func
+from .models import Rental
+from .database import BackgroundSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# ONE WORKER SWEEPS AT A TIME, THE OTHERS SKIP THE ROUND INSTEAD OF WAITING FOR THE LOCK
+SWEEP_LOCK = 20231002
+
+last_sweep = {"runs": 0, "skipped": 0, "updated": 0, "last_updated": None, "last_seconds": None, "last_run": None}
+
+# EVERY ACTIVE RENTAL PAST ITS end_date BECOMES OVERDUE IN ONE UPDATE OVER ix_rentals_active_end_date
+# RETURNS {"updated": ROWS, "seconds": DURATION}, updated IS None WHEN ANOTHER PROCESS HELD THE LOCK
+async def sweep_overdue(db):
+    started = time.perf_counter()
+    if not await db.scalar(select(func.pg_try_advisory_xact_lock(SWEEP_LOCK))):
+        await db.rollback()
+        last_sweep["skipped"] += 1
+        return {"updated": None, "seconds": round(time.perf_counter() - started, 3)}
+
+    result = await db.execute(update(Rental)
+        .where(Rental.status == "active", Rental.end_date < func.now())
+        .values(status="overdue")
+        .execution_options(synchronize_session=False))
+    await db.commit()
+
+    seconds = round(time.perf_counter() - started, 3)
+    last_sweep["runs"] += 1
+    last_sweep["updated"] += result.rowcount
+    last_sweep["last_updated"] = result.rowcount
+    last_sweep["last_seconds"] = seconds
+    last_sweep["last_run"] = time.time()
+    return {"updated": result.rowcount, "seconds": seconds}
+
+async def sweep_once():
+    db = BackgroundSessionLocal()
+    try:
+        return await sweep_overdue(db)
+    finally:
+        await db.close()
+
+# LIFESPAN TASK, A FAILED ROUND IS LOGGED AND RETRIED AFTER THE NEXT interval
+async def run_sweeper(interval: float):
+    while True:
+        try:
+            result = await sweep_once()
+            if result["updated"]:
+                logger.info("marked %d rentals overdue in %.3fs", result["updated"], result["seconds"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("overdue sweep failed")
+        await asyncio.sleep(interval)
+
+def sweeper_stats():
+    return dict(last_sweep)